@@ -0,0 +1,722 @@
+#!/usr/bin/env python2.7
+
+# Benchmarks different parts of boobytraps.py in-process on maps generated by
+# gravedigger.py and writes the results to stdout as comma-separated values.
+# The engines subcommand compares the search engines selectable using the
+# --engine option of boobytraps.py across map sizes.
+# The cells subcommand compares the hash function of Cell with the original one,
+# which collides for many cells, when building a Graph and running raidTomb.
+# The graphs subcommand compares the build time and memory usage of Graph and
+# CSRGraph.
+# The phases subcommand times parsing, graph building and search separately,
+# with warmup and repetitions, and writes medians and percentiles as CSV (with
+# the same leading columns as repeatoffender.sh) or JSON.
+# The compare subcommand compares two results of the phases subcommand (or of
+# repeatoffender.sh) and flags regressions.
+# The replan subcommand compares updating the shortest path after random cell
+# edits using Replanner with solving the edited map from scratch.
+# The server subcommand generates load for a server started using
+# boobytraps.py --serve and measures the latency of its answers.
+# The hierarchical subcommand compares the answers and query times of the
+# hierarchical engine with exact search across cluster sizes.
+# The scaling subcommand measures how the parallel engine scales with the
+# number of worker processes on large maps.
+#
+# Usage: ./boobytraps-benchmark.py [engines | cells | graphs | phases | compare | replan | server | hierarchical | scaling] [OPTIONS]
+#
+#        For OPTIONS, see ./boobytraps-benchmark.py engines -h,
+#        ./boobytraps-benchmark.py cells -h, ./boobytraps-benchmark.py graphs -h,
+#        ./boobytraps-benchmark.py phases -h, ./boobytraps-benchmark.py compare -h,
+#        ./boobytraps-benchmark.py replan -h, ./boobytraps-benchmark.py server -h,
+#        ./boobytraps-benchmark.py hierarchical -h or ./boobytraps-benchmark.py scaling -h.
+#
+# Examples: ./boobytraps-benchmark.py engines --sizes 50,100,200 --mode dungeon
+#           ./boobytraps-benchmark.py engines --engines statespace,bidirectional -n 10
+#           ./boobytraps-benchmark.py cells --sizes 200
+#           ./boobytraps-benchmark.py graphs --sizes 100,200 --mode dungeon
+#           ./boobytraps-benchmark.py phases --mode dungeon > before.csv
+#           ./boobytraps-benchmark.py compare before.csv after.csv
+#           ./boobytraps-benchmark.py replan --sizes 100,200 --edits 50
+#           ./boobytraps-benchmark.py server /tmp/boobytraps.sock --connections 8
+#           ./boobytraps-benchmark.py hierarchical --sizes 1000 --clustersizes 16,32 --nolimit
+#           ./boobytraps-benchmark.py scaling --sizes 1000 --workers 1,2,4,8 --mode dungeon
+
+import argparse
+import collections
+import gc
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import threading
+import time
+from boobytraps import *
+from catacombs import Corpus
+
+
+def generateInput(width, height, seed, gravediggerOptions=[]):
+    """Generate a map with start and end in the upper left and lower right
+    corners using gravedigger.py, returning the lines of the input.
+    """
+    gravedigger = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gravedigger.py")
+    command = [sys.executable, gravedigger, "--seed", seed, "--start", "0,0", "--end", str(width - 1) + "," + str(height - 1)]
+    command += gravediggerOptions + [str(width), str(height)]
+    return subprocess.check_output(command).splitlines()
+
+
+def generateMap(width, height, seed, gravediggerOptions=[]):
+    """Generate a map like generateInput and parse it."""
+    return parseInput(generateInput(width, height, seed, gravediggerOptions))
+
+
+def legacyHash(cell):
+    """The original hash function of Cell: the value repeated x * y times, which
+    is the empty string for each cell in the first row or column.
+    """
+    return hash(cell.x * cell.y * cell.value)
+
+
+def benchmarkEngines(args, gravediggerOptions):
+    """Run each engine on the same maps for every map size and print the time
+    taken and number of states expanded per sample, making sure all engines
+    agree on the number of moves. Finally, print the crossover map size from
+    which on each engine is faster than the first one to stderr.
+    """
+    engines = args.engines.split(",")
+    sizes = [int(i) for i in args.sizes.split(",")]
+    times = dict((engine, []) for engine in engines)
+    print "Map width/height, Number of map cells (i.e. width * height), Engine, Number of samples, Total time taken (in s), Time taken per sample (in ms), States expanded per sample, Number of solvable maps"
+
+    for size in sizes:
+        maps = [generateMap(size, size, "benchmark-" + str(size) + "-" + str(i), gravediggerOptions) for i in xrange(args.samples)]
+
+        results = {}
+        for engine in engines:
+            totalTime = 0
+            totalExpanded = 0
+            results[engine] = []
+            for traps, map, graph, start, end in maps:
+                stats = {}
+                t = time.time()
+                moves, path, visited = ENGINES[engine](graph, traps, start, end, stats=stats)
+                totalTime += time.time() - t
+                totalExpanded += stats['expanded']
+                results[engine].append(moves)
+
+            times[engine].append(totalTime)
+            solvable = len([moves for moves in results[engine] if moves >= 0])
+            print str(size) + ", " + str(size * size) + ", " + engine + ", " + str(args.samples) + ", " + "%.6f" % totalTime + ", " + "%.3f" % (totalTime / args.samples * 1000) + ", " + "%.1f" % (float(totalExpanded) / args.samples) + ", " + str(solvable)
+
+        # compare against the first engine
+        for engine in engines[1:]:
+            if results[engine] != results[engines[0]]:
+                sys.stderr.write("warning: " + engine + " and " + engines[0] + " disagree on the number of moves for size " + str(size) + "\n")
+
+    # find the smallest size from which on an engine is always faster
+    for engine in engines[1:]:
+        crossover = None
+        for size, time1, time2 in reversed(zip(sizes, times[engines[0]], times[engine])):
+            if time2 >= time1:
+                break
+            crossover = size
+        if crossover is None:
+            sys.stderr.write(engine + " is not faster than " + engines[0] + " for the largest size\n")
+        else:
+            sys.stderr.write(engine + " is faster than " + engines[0] + " from size " + str(crossover) + " on\n")
+
+
+def benchmarkCells(args, gravediggerOptions):
+    """Build the adjacency list Graph of the same maps and run the reference
+    engine (raidTomb) on them, which both store cells in dictionaries and sets,
+    using the original and the current hash function of Cell, printing the
+    number of distinct hash values and the time taken per sample. (The default
+    engine works on the cell ids of a CSRGraph, so it never hashes cells.)
+    """
+    print "Map width/height, Number of map cells (i.e. width * height), Hash function, Number of samples, Distinct hash values per sample, Graph building time per sample (in ms), Search time per sample (in ms)"
+
+    currentHash = Cell.__hash__
+    for size in [int(i) for i in args.sizes.split(",")]:
+        inputs = [generateInput(size, size, "benchmark-" + str(size) + "-" + str(i), gravediggerOptions) for i in xrange(args.samples)]
+
+        for name, hashFunction in [("legacy", legacyHash), ("current", currentHash)]:
+            Cell.__hash__ = hashFunction
+            try:
+                graphTime = searchTime = 0
+                distinct = 0
+                for input in inputs:
+                    traps, map, graph, start, end = parseInput(input, buildGraph=False)
+
+                    t = time.time()
+                    graph = Graph(map)
+                    graphTime += time.time() - t
+
+                    t = time.time()
+                    raidTomb(graph, traps, start, end)
+                    searchTime += time.time() - t
+
+                    distinct += len(set(hash(cell) for cell in graph.graph))
+            finally:
+                Cell.__hash__ = currentHash
+
+            print str(size) + ", " + str(size * size) + ", " + name + ", " + str(args.samples) + ", " + "%.1f" % (float(distinct) / args.samples) + ", " + "%.3f" % (graphTime / args.samples * 1000) + ", " + "%.3f" % (searchTime / args.samples * 1000)
+
+
+def graphSize(graph):
+    """Estimate the memory used by a graph (in bytes) using sys.getsizeof,
+    counting each cell object referenced by a Graph once.
+    """
+    if isinstance(graph, CSRGraph):
+        return sum(a.buffer_info()[1] * a.itemsize for a in [graph.offsets, graph.neighbors]) + sys.getsizeof(graph.values)
+
+    size = sys.getsizeof(graph.graph)
+    cells = set()
+    for cell, adj in graph.graph.items():
+        size += sys.getsizeof(adj)
+        cells.add(id(cell))
+        cells.update(id(a) for a in adj)
+    return size + len(cells) * sys.getsizeof(Cell(0, 0, 'o'))
+
+
+def benchmarkGraphs(args, gravediggerOptions):
+    """Build Graph and CSRGraph for the same maps, printing the build time and
+    estimated memory usage per sample.
+    """
+    print "Map width/height, Number of map cells (i.e. width * height), Graph class, Number of samples, Build time per sample (in ms), Memory usage per sample (in KiB)"
+
+    for size in [int(i) for i in args.sizes.split(",")]:
+        inputs = [generateInput(size, size, "benchmark-" + str(size) + "-" + str(i), gravediggerOptions) for i in xrange(args.samples)]
+
+        for graphClass in [Graph, CSRGraph]:
+            buildTime = 0
+            memory = 0
+            for input in inputs:
+                traps = Traps(input[0])
+                map = Map(size, size, input[2:size+2], traps)  # fresh map without any cells created yet
+
+                t = time.time()
+                graph = graphClass(map)
+                buildTime += time.time() - t
+
+                memory += graphSize(graph)
+
+            print str(size) + ", " + str(size * size) + ", " + graphClass.__name__ + ", " + str(args.samples) + ", " + "%.3f" % (buildTime / args.samples * 1000) + ", " + "%.1f" % (memory / 1024.0 / args.samples)
+
+
+def percentile(values, p):
+    """Compute the p-th percentile of a list of values, interpolating linearly
+    between the closest ranks.
+    """
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def timePhases(input, engine, graphClass, parser="text"):
+    """Parse the input, build the graph and search for the shortest path,
+    returning the time taken by each of these phases. The input is parsed
+    without building the graph, either from a buffer using parseTextMap (like
+    boobytraps.py does for a single map) if parser is "text", or from its lines
+    using parseInput if parser is "lines".
+    """
+    if parser == "text":
+        data = "\n".join(input) + "\n"
+
+    t0 = time.time()
+    if parser == "text":
+        traps, map, graph, start, end = parseTextMap(data, buildGraph=False)
+    else:
+        traps, map, graph, start, end = parseInput(input, buildGraph=False)
+
+    t1 = time.time()
+    graph = graphClass(map)
+
+    t2 = time.time()
+    ENGINES[engine](graph, traps, start, end)
+
+    t3 = time.time()
+    return t1 - t0, t2 - t1, t3 - t2
+
+
+PHASES = ["Parsing", "Graph building", "Search"]
+PHASE_PERCENTILES = [("median", 50), ("10th percentile", 10), ("90th percentile", 90)]
+
+
+def benchmarkPhases(args, gravediggerOptions):
+    """Time the phases of solving the same maps for every map size after some
+    warmup runs, printing the total time taken (the sum of the median total time
+    per map, with the same columns as repeatoffender.sh) as well as the median
+    and percentiles of the time taken by each phase, as CSV or JSON.
+    """
+    graphClass = {"csr": CSRGraph, "adjacency": Graph}[args.graph]
+    columns = ["Map width/height", "Number of map cells (i.e. width * height)", "Number of samples", "Total time taken (in s)", "Time taken per sample (i.e. total time taken / number of samples; in s)", "Time taken per sample (in ms)", "Engine", "Repetitions", "Parser"]
+    for phase in PHASES:
+        for name, p in PHASE_PERCENTILES:
+            columns.append(phase + " time per sample (" + name + "; in ms)")
+
+    rows = []
+    if args.format == "csv":
+        print ", ".join(columns)
+
+    # generate the maps upfront or take them from a corpus built by catacombs.py
+    if args.corpus:
+        corpus = Corpus(args.corpus)
+        sizes = collections.OrderedDict()
+        for i, entry in enumerate(corpus.entries):
+            sizes.setdefault((entry.width, entry.height), []).append(corpus.getText(i).splitlines())
+    else:
+        sizes = collections.OrderedDict()
+        for size in [int(i) for i in args.sizes.split(",")]:
+            sizes[(size, size)] = [generateInput(size, size, "benchmark-" + str(size) + "-" + str(i), gravediggerOptions) for i in xrange(args.samples)]
+
+    for (width, height), inputs in sizes.items():
+        times = [[] for phase in PHASES]
+        total = 0
+        for input in inputs:
+            for i in xrange(args.warmup):
+                timePhases(input, args.engine, graphClass, args.parser)
+
+            # don't let the garbage collector interfere with timing, like timeit
+            gcEnabled = gc.isenabled()
+            gc.disable()
+            try:
+                repetitions = [timePhases(input, args.engine, graphClass, args.parser) for i in xrange(args.repetitions)]
+            finally:
+                if gcEnabled:
+                    gc.enable()
+
+            for phase, phaseTimes in enumerate(zip(*repetitions)):
+                times[phase] += phaseTimes
+            total += percentile([sum(repetition) for repetition in repetitions], 50)
+
+        samples = len(inputs)
+        row = [width, width * height, samples, round(total, 6), round(total / samples, 8), round(total / samples * 1000, 5), args.engine, args.repetitions, args.parser]
+        for phaseTimes in times:
+            for name, p in PHASE_PERCENTILES:
+                row.append(round(percentile(phaseTimes, p) * 1000, 5))
+
+        if args.format == "csv":
+            print ", ".join(str(value) for value in row)
+            sys.stdout.flush()
+        else:
+            rows.append(collections.OrderedDict(zip(columns, row)))
+
+    if args.format == "json":
+        print json.dumps(rows, indent=2)
+
+
+def loadResults(filename):
+    """Load the results written by the phases subcommand (or by
+    repeatoffender.sh) as a list of dicts, one per row, with numbers as floats.
+    """
+    with open(filename) as f:
+        content = f.read()
+
+    if content.lstrip().startswith("["):
+        rows = json.loads(content)
+    else:
+        lines = [line for line in content.splitlines() if line.strip()]
+        columns = [column.strip() for column in lines[0].split(",")]
+        rows = [dict(zip(columns, [value.strip() for value in line.split(",")])) for line in lines[1:]]
+
+    results = []
+    for row in rows:
+        result = {}
+        for column, value in row.items():
+            try:
+                result[column] = float(value)
+            except (TypeError, ValueError):
+                result[column] = value
+        results.append(result)
+    return results
+
+
+def compareResults(args):
+    """Compare the time taken per sample of two results for every map size and
+    phase, printing the relative change and flagging it as a regression if it
+    exceeds the threshold. Returns whether any regressions were found.
+    """
+    old = dict((row["Map width/height"], row) for row in loadResults(args.old))
+    new = dict((row["Map width/height"], row) for row in loadResults(args.new))
+    print "Map width/height, Measurement, Old (in ms), New (in ms), Change (in %), Verdict"
+
+    regressions = 0
+    for size in sorted(set(old) & set(new)):
+        for column in sorted(set(old[size]) & set(new[size])):
+            if "in ms" not in column or "percentile" in column:
+                continue
+            oldTime, newTime = old[size][column], new[size][column]
+            change = (newTime - oldTime) / oldTime * 100 if oldTime else 0.0
+
+            verdict = ""
+            if newTime - oldTime > args.mindelta and change > args.threshold:
+                verdict = "REGRESSION"
+                regressions += 1
+            elif oldTime - newTime > args.mindelta and -change > args.threshold:
+                verdict = "improvement"
+
+            print "%g, %s, %.5f, %.5f, %+.1f, %s" % (size, column, oldTime, newTime, change, verdict)
+
+    if regressions:
+        sys.stderr.write(str(regressions) + " regression(s) of more than " + str(args.threshold) + "% found\n")
+    return regressions > 0
+
+
+def benchmarkReplanning(args, gravediggerOptions):
+    """Apply random cell edits (opening or closing walls, adding or removing
+    traps) to the same maps for every map size, updating the shortest path using
+    Replanner and solving the edited map from scratch (parsing, graph building
+    and search) after each edit, printing the time taken and states expanded per
+    edit as well as the share of work saved, making sure both agree on the
+    number of moves.
+    """
+    print "Map width/height, Number of map cells (i.e. width * height), Number of samples, Edits per sample, Incremental time per edit (in ms), Full recompute time per edit (in ms), States expanded per edit (incremental), States expanded per edit (full recompute), Work saved (in %)"
+
+    for size in [int(i) for i in args.sizes.split(",")]:
+        inputs = [generateInput(size, size, "benchmark-" + str(size) + "-" + str(i), gravediggerOptions) for i in xrange(args.samples)]
+        rand = random.Random("replan-" + str(size))
+
+        incrementalTime = fullTime = 0
+        incrementalExpanded = fullExpanded = 0
+        for input in inputs:
+            # load the map like boobytraps.py does, so it's backed by the input
+            traps, map, graph, start, end = parseTextMap("\n".join(input) + "\n")
+            replanner = Replanner(traps, map, start, end)
+
+            for i in xrange(args.edits):
+                x = rand.randrange(size)
+                y = rand.randrange(size)
+                value = rand.choice(['o', 'x', rand.choice(traps.trapDominationOrder)])
+
+                t = time.time()
+                report = replanner.editCells([(x, y, value)])
+                moves, path = replanner.query()
+                incrementalTime += time.time() - t
+                incrementalExpanded += report['expanded']
+                fullExpanded += report['fullExpanded']
+
+                # solve the edited map from scratch
+                edited = input[:2] + ["".join(row) for row in map.map] + input[size+2:size+4]
+                t = time.time()
+                editedTraps, editedMap, editedGraph, editedStart, editedEnd = parseInput(edited)
+                fullMoves, fullPath, visited = raidTombStateSpace(editedGraph, editedTraps, editedStart, editedEnd)
+                fullTime += time.time() - t
+
+                if moves != fullMoves:
+                    sys.stderr.write("warning: incremental and full recompute disagree on the number of moves for size " + str(size) + "\n")
+
+        edits = args.samples * args.edits
+        print str(size) + ", " + str(size * size) + ", " + str(args.samples) + ", " + str(args.edits) + ", " + "%.3f" % (incrementalTime / edits * 1000) + ", " + "%.3f" % (fullTime / edits * 1000) + ", " + "%.1f" % (float(incrementalExpanded) / edits) + ", " + "%.1f" % (float(fullExpanded) / edits) + ", " + "%.1f" % ((1 - float(incrementalExpanded) / fullExpanded) * 100)
+        sys.stdout.flush()
+
+
+def benchmarkServer(args, gravediggerOptions):
+    """Upload the same maps to a server started using boobytraps.py --serve for
+    every map size and send queries between random non-wall cells over several
+    connections at once, printing the upload time per map, percentiles of the
+    query latency and the throughput, making sure the answers agree with solving
+    the queries in this process. Queries are drawn from a smaller number of
+    distinct ones, so some are answered from the cache of the server.
+    """
+    print "Map width/height, Number of map cells (i.e. width * height), Number of samples, Connections, Queries, Distinct queries, Upload time per sample (in ms), Median query latency (in ms), 90th percentile query latency (in ms), 99th percentile query latency (in ms), Maximum query latency (in ms), Throughput (in queries per second)"
+
+    for size in [int(i) for i in args.sizes.split(",")]:
+        inputs = [generateInput(size, size, "benchmark-" + str(size) + "-" + str(i), gravediggerOptions) for i in xrange(args.samples)]
+        rand = random.Random("server-" + str(size))
+
+        client = SessionClient(args.address)
+        t = time.time()
+        handles = [client.upload(input) for input in inputs]
+        uploadTime = time.time() - t
+        client.close()
+
+        queries = []
+        for i in xrange(args.distinct):
+            j = rand.randrange(len(inputs))
+            open = [(x, y) for y, row in enumerate(inputs[j][2:size+2]) for x, value in enumerate(row) if value != 'x']
+            queries.append((j, rand.choice(open), rand.choice(open)))
+        workload = [rand.choice(queries) for i in xrange(args.queries)]
+
+        latencies = []
+        answers = {}
+
+        def sendQueries(part):
+            client = SessionClient(args.address)
+            for query in part:
+                j, start, end = query
+                t = time.time()
+                for attempt in xrange(3):
+                    try:
+                        moves, path = client.query(handles[j], start, end)
+                        break
+                    except ValueError:  # discarded by the server, upload it again
+                        client.upload(inputs[j])
+                else:
+                    continue
+                latencies.append(time.time() - t)
+                answers[query] = moves
+            client.close()
+
+        threads = [threading.Thread(target=sendQueries, args=(workload[i::args.connections],)) for i in xrange(args.connections)]
+        t = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        totalTime = time.time() - t
+
+        if len(latencies) != len(workload):
+            sys.stderr.write("warning: " + str(len(workload) - len(latencies)) + " queries failed for size " + str(size) + "\n")
+
+        # solve the distinct queries in this process
+        maps = [parseInput(input) for input in inputs]
+        for query, moves in answers.iteritems():
+            j, start, end = query
+            traps, map, graph, s, e = maps[j]
+            if raidTombStateSpace(graph, traps, map.getCell(*start), map.getCell(*end))[0] != moves:
+                sys.stderr.write("warning: server and this process disagree on the number of moves for size " + str(size) + "\n")
+                break
+
+        latencies = [latency * 1000 for latency in latencies]
+        print str(size) + ", " + str(size * size) + ", " + str(args.samples) + ", " + str(args.connections) + ", " + str(args.queries) + ", " + str(args.distinct) + ", " + "%.3f" % (uploadTime / args.samples * 1000) + ", " + ", ".join("%.3f" % percentile(latencies, p) for p in [50, 90, 99, 100]) + ", " + "%.1f" % (len(latencies) / totalTime)
+        sys.stdout.flush()
+
+
+def benchmarkHierarchy(args, gravediggerOptions):
+    """Answer queries between random connected non-wall cells of the same maps
+    for every map size and cluster size using a Hierarchy, timing the first
+    query on a fresh hierarchy (which computes most distances between portals)
+    and the remaining ones separately, and compare the answers with the exact
+    ones of raidTombStateSpace, printing the share of optimal answers and the
+    mean number of excess moves.
+    """
+    print "Map width/height, Number of map cells (i.e. width * height), Number of samples, Cluster size, Queries per sample, Exact time per query (in ms), Build time per sample (in ms), First query time (in ms), Later query time (in ms), Optimal answers (in %), Mean excess moves, Fallbacks to exact search"
+
+    for size in [int(i) for i in args.sizes.split(",")]:
+        maps = [generateMap(size, size, "benchmark-" + str(size) + "-" + str(i), gravediggerOptions) for i in xrange(args.samples)]
+        rand = random.Random("hierarchy-" + str(size))
+
+        # draw queries between cells connected ignoring the trap order, and
+        # solve them exactly once
+        workloads = []
+        exactTime = 0
+        for traps, map, graph, start, end in maps:
+            index = ConnectivityIndex(map, traps)
+            open = [(x, y) for y, row in enumerate(map.map) for x, value in enumerate(row) if value != 'x']
+            queries = []
+            while len(queries) < args.queries:
+                query = (map.getCell(*rand.choice(open)), map.getCell(*rand.choice(open)))
+                if index.query(*query)[0]:
+                    queries.append(query)
+
+            exact = []
+            t = time.time()
+            for queryStart, queryEnd in queries:
+                exact.append(raidTombStateSpace(graph, traps, queryStart, queryEnd)[0])
+            exactTime += time.time() - t
+            workloads.append((queries, exact))
+
+        for clusterSize in [int(i) for i in args.clustersizes.split(",")]:
+            buildTime = firstTime = laterTime = 0
+            optimal = excess = solved = fallbacks = 0
+            for (traps, map, graph, start, end), (queries, exact) in zip(maps, workloads):
+                t = time.time()
+                hierarchy = Hierarchy(map, graph, traps, clusterSize)
+                buildTime += time.time() - t
+
+                for i, (queryStart, queryEnd) in enumerate(queries):
+                    stats = {}
+                    t = time.time()
+                    moves, path, visited = hierarchy.query(queryStart, queryEnd, stats)
+                    if i == 0:
+                        firstTime += time.time() - t
+                    else:
+                        laterTime += time.time() - t
+
+                    if (moves < 0) != (exact[i] < 0) or moves < exact[i]:
+                        sys.stderr.write("warning: hierarchical and exact search disagree for size " + str(size) + "\n")
+                    if moves >= 0:
+                        solved += 1
+                        optimal += moves == exact[i]
+                        excess += moves - exact[i]
+                    fallbacks += stats['fallback']
+
+            queries = args.samples * args.queries
+            print str(size) + ", " + str(size * size) + ", " + str(args.samples) + ", " + str(clusterSize) + ", " + str(args.queries) + ", " + "%.3f" % (exactTime / queries * 1000) + ", " + "%.3f" % (buildTime / args.samples * 1000) + ", " + "%.3f" % (firstTime / args.samples * 1000) + ", " + "%.3f" % (laterTime / max(1, queries - args.samples) * 1000) + ", " + "%.1f" % (float(optimal) / max(1, solved) * 100) + ", " + "%.2f" % (float(excess) / max(1, solved)) + ", " + str(fallbacks)
+            sys.stdout.flush()
+
+
+def benchmarkScaling(args, gravediggerOptions):
+    """Solve the same maps for every map size using raidTombStateSpace and the
+    parallel engine with an increasing number of worker processes, printing
+    the time taken per sample and the speedup over raidTombStateSpace and over
+    a single worker (which is always measured first), making sure the parallel
+    engine finds the same path.
+    """
+    print "Map width/height, Number of map cells (i.e. width * height), Workers, Number of samples, Time taken per sample (in ms), Speedup over statespace, Speedup over one worker, Parallel efficiency (in %)"
+
+    if "--nolimit" not in gravediggerOptions:
+        gravediggerOptions = gravediggerOptions + ["--nolimit"]
+    for size in [int(i) for i in args.sizes.split(",")]:
+        maps = [generateMap(size, size, "benchmark-" + str(size) + "-" + str(i), gravediggerOptions) for i in xrange(args.samples)]
+
+        sequentialTime = 0
+        results = []
+        for traps, map, graph, start, end in maps:
+            t = time.time()
+            moves, path, visited = raidTombStateSpace(graph, traps, start, end)
+            sequentialTime += time.time() - t
+            results.append((moves, path))
+
+        singleTime = None
+        for workers in [1] + [int(i) for i in args.workers.split(",") if int(i) != 1]:
+            totalTime = 0
+            for (traps, map, graph, start, end), result in zip(maps, results):
+                t = time.time()
+                moves, path, visited = raidTombParallel(graph, traps, start, end, workers=workers)
+                totalTime += time.time() - t
+                if (moves, path) != result:
+                    sys.stderr.write("warning: parallel engine with " + str(workers) + " workers and statespace disagree for size " + str(size) + "\n")
+
+            if singleTime is None:
+                singleTime = totalTime
+            print str(size) + ", " + str(size * size) + ", " + str(workers) + ", " + str(args.samples) + ", " + "%.3f" % (totalTime / args.samples * 1000) + ", " + "%.2f" % (sequentialTime / totalTime) + ", " + "%.2f" % (singleTime / totalTime) + ", " + "%.1f" % (singleTime / totalTime / workers * 100)
+            sys.stdout.flush()
+
+
+def main():
+    # process options
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="subcommand", title="subcommands", help="choose from these subcommands")
+
+    parser_engines = subparsers.add_parser("engines", help="compare the search engines of boobytraps.py, remaining options are passed to gravedigger.py")
+    parser_engines.add_argument("--engines", type=str, help="comma-separated list of engines, the first one is used as the reference for checking the number of moves (default: statespace,bidirectional)")
+    parser_engines.set_defaults(engines="statespace,bidirectional")
+    parser_engines.add_argument("--sizes", type=str, help="comma-separated list of map widths/heights (default: 25,50,100,150,200)")
+    parser_engines.set_defaults(sizes="25,50,100,150,200")
+    parser_engines.add_argument("-n", dest="samples", type=int, help="number of maps per size (default: 5)")
+    parser_engines.set_defaults(samples=5)
+
+    parser_cells = subparsers.add_parser("cells", help="compare the original and the current hash function of cells, remaining options are passed to gravedigger.py")
+    parser_cells.add_argument("--sizes", type=str, help="comma-separated list of map widths/heights (default: 50,100,200)")
+    parser_cells.set_defaults(sizes="50,100,200")
+    parser_cells.add_argument("-n", dest="samples", type=int, help="number of maps per size (default: 3)")
+    parser_cells.set_defaults(samples=3)
+
+    parser_graphs = subparsers.add_parser("graphs", help="compare the build time and memory usage of Graph and CSRGraph, remaining options are passed to gravedigger.py")
+    parser_graphs.add_argument("--sizes", type=str, help="comma-separated list of map widths/heights (default: 50,100,200)")
+    parser_graphs.set_defaults(sizes="50,100,200")
+    parser_graphs.add_argument("-n", dest="samples", type=int, help="number of maps per size (default: 3)")
+    parser_graphs.set_defaults(samples=3)
+
+    parser_phases = subparsers.add_parser("phases", help="time parsing, graph building and search separately, remaining options are passed to gravedigger.py")
+    parser_phases.add_argument("--engine", choices=sorted(ENGINES.keys()), help="search engine (default: statespace)")
+    parser_phases.set_defaults(engine="statespace")
+    parser_phases.add_argument("--graph", choices=["csr", "adjacency"], help="graph representation, the compressed sparse row representation used by boobytraps.py or the adjacency list representation (default: csr)")
+    parser_phases.set_defaults(graph="csr")
+    parser_phases.add_argument("--parser", choices=["text", "lines"], help="parser, parseTextMap reading the map from a buffer like boobytraps.py does for a single map, or parseInput reading it line by line like for --multi (default: text)")
+    parser_phases.set_defaults(parser="text")
+    parser_phases.add_argument("--sizes", type=str, help="comma-separated list of map widths/heights (default: 25,50,100,150,200)")
+    parser_phases.set_defaults(sizes="25,50,100,150,200")
+    parser_phases.add_argument("-n", dest="samples", type=int, help="number of maps per size (default: 5)")
+    parser_phases.set_defaults(samples=5)
+    parser_phases.add_argument("--warmup", type=int, help="number of untimed runs per map (default: 1)")
+    parser_phases.set_defaults(warmup=1)
+    parser_phases.add_argument("--repetitions", type=int, help="number of timed runs per map (default: 5)")
+    parser_phases.set_defaults(repetitions=5)
+    parser_phases.add_argument("--corpus", metavar="CORPUS_FILE", help="take the maps from a corpus built by catacombs.py instead of generating them, grouped by map size")
+    parser_phases.add_argument("--format", choices=["csv", "json"], help="output format (default: csv)")
+    parser_phases.set_defaults(format="csv")
+
+    parser_compare = subparsers.add_parser("compare", help="compare two results of the phases subcommand or repeatoffender.sh and flag regressions, exiting with status 1 if there are any")
+    parser_compare.add_argument("old", metavar="OLD_RESULTS", help="CSV or JSON file with the baseline results")
+    parser_compare.add_argument("new", metavar="NEW_RESULTS", help="CSV or JSON file with the results to compare against the baseline")
+    parser_compare.add_argument("--threshold", type=float, help="relative slowdown (in %%) from which on a change is flagged as a regression (default: 10)")
+    parser_compare.set_defaults(threshold=10.0)
+    parser_compare.add_argument("--mindelta", type=float, help="absolute slowdown (in ms) below which a change is never flagged, to ignore noise on tiny maps (default: 0.05)")
+    parser_compare.set_defaults(mindelta=0.05)
+
+    parser_replan = subparsers.add_parser("replan", help="compare updating the shortest path after random cell edits with solving the edited map from scratch, remaining options are passed to gravedigger.py")
+    parser_replan.add_argument("--sizes", type=str, help="comma-separated list of map widths/heights (default: 50,100,200)")
+    parser_replan.set_defaults(sizes="50,100,200")
+    parser_replan.add_argument("-n", dest="samples", type=int, help="number of maps per size (default: 3)")
+    parser_replan.set_defaults(samples=3)
+    parser_replan.add_argument("--edits", type=int, help="number of single-cell edits per map (default: 20)")
+    parser_replan.set_defaults(edits=20)
+
+    parser_server = subparsers.add_parser("server", help="measure the query latency and throughput of a server started using boobytraps.py --serve, remaining options are passed to gravedigger.py")
+    parser_server.add_argument("address", metavar="ADDRESS", help="address of the server, either HOST:PORT or the path of a Unix socket")
+    parser_server.add_argument("--sizes", type=str, help="comma-separated list of map widths/heights (default: 50,100,200)")
+    parser_server.set_defaults(sizes="50,100,200")
+    parser_server.add_argument("-n", dest="samples", type=int, help="number of maps per size (default: 3)")
+    parser_server.set_defaults(samples=3)
+    parser_server.add_argument("--queries", type=int, help="number of queries per size (default: 1000)")
+    parser_server.set_defaults(queries=1000)
+    parser_server.add_argument("--distinct", type=int, help="number of distinct queries per size the queries are drawn from (default: 100)")
+    parser_server.set_defaults(distinct=100)
+    parser_server.add_argument("--connections", type=int, help="number of connections sending queries at once (default: 4)")
+    parser_server.set_defaults(connections=4)
+
+    parser_hierarchy = subparsers.add_parser("hierarchical", help="compare the answers and query times of the hierarchical engine with exact search across cluster sizes, remaining options are passed to gravedigger.py")
+    parser_hierarchy.add_argument("--sizes", type=str, help="comma-separated list of map widths/heights (default: 50,100,200)")
+    parser_hierarchy.set_defaults(sizes="50,100,200")
+    parser_hierarchy.add_argument("-n", dest="samples", type=int, help="number of maps per size (default: 3)")
+    parser_hierarchy.set_defaults(samples=3)
+    parser_hierarchy.add_argument("--queries", type=int, help="number of queries per map (default: 20)")
+    parser_hierarchy.set_defaults(queries=20)
+    parser_hierarchy.add_argument("--clustersizes", type=str, help="comma-separated list of cluster widths/heights (default: 8,16,32)")
+    parser_hierarchy.set_defaults(clustersizes="8,16,32")
+
+    parser_scaling = subparsers.add_parser("scaling", help="measure how the parallel engine scales with the number of worker processes, remaining options are passed to gravedigger.py")
+    parser_scaling.add_argument("--sizes", type=str, help="comma-separated list of map widths/heights (default: 1000)")
+    parser_scaling.set_defaults(sizes="1000")
+    parser_scaling.add_argument("-n", dest="samples", type=int, help="number of maps per size (default: 3)")
+    parser_scaling.set_defaults(samples=3)
+    parser_scaling.add_argument("--workers", type=str, help="comma-separated list of numbers of worker processes (default: 1, 2, 4, ... up to the number of CPUs)")
+
+    args, gravediggerOptions = parser.parse_known_args()
+
+    if args.subcommand == "engines":
+        for engine in args.engines.split(","):
+            if engine not in ENGINES:
+                parser.error("unknown engine: " + engine)
+        benchmarkEngines(args, gravediggerOptions)
+    if args.subcommand == "cells":
+        benchmarkCells(args, gravediggerOptions)
+    if args.subcommand == "graphs":
+        benchmarkGraphs(args, gravediggerOptions)
+    if args.subcommand == "phases":
+        if args.samples < 1 or args.repetitions < 1 or args.warmup < 0:
+            parser.error("-n and --repetitions must be positive, --warmup must not be negative")
+        benchmarkPhases(args, gravediggerOptions)
+    if args.subcommand == "replan":
+        benchmarkReplanning(args, gravediggerOptions)
+    if args.subcommand == "server":
+        if args.samples < 1 or args.queries < 1 or args.distinct < 1 or args.connections < 1:
+            parser.error("-n, --queries, --distinct and --connections must be positive")
+        benchmarkServer(args, gravediggerOptions)
+    if args.subcommand == "hierarchical":
+        if args.samples < 1 or args.queries < 1:
+            parser.error("-n and --queries must be positive")
+        for clusterSize in args.clustersizes.split(","):
+            if int(clusterSize) < 2:
+                parser.error("cluster sizes must be at least 2")
+        benchmarkHierarchy(args, gravediggerOptions)
+    if args.subcommand == "scaling":
+        if args.workers is None:
+            cpus = multiprocessing.cpu_count()
+            args.workers = ",".join(str(2 ** i) for i in xrange(cpus.bit_length()) if 2 ** i < cpus)
+            args.workers = (args.workers + "," + str(cpus)).lstrip(",")
+        if args.samples < 1 or min(int(i) for i in args.workers.split(",")) < 1:
+            parser.error("-n and --workers must be positive")
+        benchmarkScaling(args, gravediggerOptions)
+    if args.subcommand == "compare":
+        if gravediggerOptions:
+            parser.error("unrecognized arguments: " + " ".join(gravediggerOptions))
+        if compareResults(args):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python2.7
+
+# Differential fuzzing of the search engines of boobytraps.py: generates maps
+# in-process using gravedigger.py across map sizes, generation modes and
+# complexities, solves each of them using the reference engine (raidTomb) and
+# a candidate engine in parallel worker processes, and checks that both agree
+# on the number of moves and that the path found by the candidate is valid,
+# i.e. leads from start to end through adjacent non-wall cells, triggering
+# traps in strictly increasing order. Failing maps are shrunk to small maps
+# that still fail and saved in the input format of boobytraps.py. The sample
+# inputs are checked the same way, and tombraider.sh is run on the sample
+# inputs with known outputs. Exits with status 1 if any check fails.
+#
+# Usage: ./boobytraps-fuzz.py [OPTIONS]
+#
+#        For OPTIONS, see ./boobytraps-fuzz.py -h.
+#
+# Examples: ./boobytraps-fuzz.py --engine bidirectional -n 5000
+#           ./boobytraps-fuzz.py --engine hierarchical --approximate --maxsize 100
+#           ./boobytraps-fuzz.py --engine parallel --modes dungeon --complexities 5,20
+
+import argparse
+import glob
+import itertools
+import multiprocessing
+import os
+import random
+import signal
+import subprocess
+import sys
+import traceback
+import gravedigger
+from boobytraps import APPROXIMATE_ENGINES, ENGINES, parseInput
+
+# the approximate engines can only be checked with --approximate
+CANDIDATES = dict(ENGINES, **APPROXIMATE_ENGINES)
+
+# sample inputs and expected outputs checked using tombraider.sh
+GOLDEN = [("sampleinput.txt", "sampleoutput.txt"), ("sampleinput2.txt", "2")]
+
+
+def instanceLines(instance):
+    """Turn a (trap domination order, rows, start, end) tuple into the lines
+    of the input format of boobytraps.py.
+    """
+    trapDominationOrder, rows, start, end = instance
+    lines = [trapDominationOrder, str(len(rows[0])) + " " + str(len(rows))]
+    lines += rows
+    lines += [str(start[0]) + " " + str(start[1]), str(end[0]) + " " + str(end[1])]
+    return lines
+
+
+def checkPath(traps, map, start, end, moves, path):
+    """Check that a path leads from start to end in the given number of moves
+    through adjacent non-wall cells, triggering traps in strictly increasing
+    order, returning a description of the first problem found or None.
+    """
+    if len(path) != moves + 1:
+        return "path has " + str(len(path) - 1) + " moves instead of " + str(moves)
+    if path[0] != start or path[-1] != end:
+        return "path doesn't lead from start to end"
+
+    triggered = traps.getIndex(start.value)
+    for i, cell in enumerate(path):
+        if not (0 <= cell.x < map.width and 0 <= cell.y < map.height) or cell.value != map.getAt(cell.x, cell.y):
+            return "cell " + str(i) + " of the path isn't on the map"
+        if cell.value == 'x':
+            return "cell " + str(i) + " of the path is a wall"
+        if i > 0:
+            previous = path[i - 1]
+            if abs(cell.x - previous.x) + abs(cell.y - previous.y) != 1:
+                return "cells " + str(i - 1) + " and " + str(i) + " of the path aren't adjacent"
+            if traps.isTrap(cell.value):
+                if traps.getIndex(cell.value) <= triggered:
+                    return "trap " + cell.value + " at cell " + str(i) + " of the path is triggered out of order"
+                triggered = traps.getIndex(cell.value)
+    return None
+
+
+class JobTimeout(Exception):
+    """Raised in a worker process once a job has taken longer than allowed."""
+
+
+def raiseJobTimeout(signum, frame):
+    raise JobTimeout()
+
+
+def checkInstance(instance, engine, reference="reference", approximate=False):
+    """Solve an instance (see instanceLines) using the reference and candidate
+    engines and compare the results, returning a description of the first
+    problem found or None. If approximate is true, the candidate may find
+    longer paths than the reference, but never shorter ones.
+    """
+    try:
+        traps, map, graph, start, end = parseInput(instanceLines(instance))
+        expected, expectedPath, visited = ENGINES[reference](graph, traps, start, end)
+        moves, path, visited = CANDIDATES[engine](graph, traps, start, end)
+    except JobTimeout:
+        raise
+    except Exception:
+        return "exception: " + traceback.format_exc().strip().splitlines()[-1]
+
+    if (moves < 0) != (expected < 0):
+        return reference + " found " + str(expected) + " moves, " + engine + " found " + str(moves)
+    if moves != expected and not (approximate and moves > expected):
+        return reference + " found " + str(expected) + " moves, " + engine + " found " + str(moves)
+    if moves >= 0:
+        problem = checkPath(traps, map, start, end, moves, path)
+        if problem is not None:
+            return engine + ": " + problem
+    return None
+
+
+def generateAndCheck(job):
+    """Generate the map for a (width, height, mode, complexity, seed, engine,
+    reference, approximate, vectorized, timeout) tuple using gravedigger.py and
+    check it using checkInstance, giving up after timeout seconds. Returns a
+    status, the instance (None if it couldn't be generated) and a description
+    of the problem found (or None). The status is "ok", "failed" if the check
+    found a problem, "timeout" if checking took too long, or "skipped" if
+    gravedigger.py failed or took too long to generate the map.
+    """
+    width, height, mode, complexity, seed, engine, reference, approximate, vectorized, timeout = job
+    signal.signal(signal.SIGALRM, raiseJobTimeout)
+    signal.alarm(timeout)
+    try:
+        try:
+            trapDominationOrdering, rows, start, end = gravedigger.generateMap(width, height, mode, complexity, seed, vectorized=vectorized)
+            instance = (trapDominationOrdering, list(rows), start, end)
+        except JobTimeout:
+            return "skipped", None, "generating the map took longer than " + str(timeout) + " s"
+        except Exception:
+            return "skipped", None, "generating the map failed: " + traceback.format_exc().strip().splitlines()[-1]
+
+        try:
+            problem = checkInstance(instance, engine, reference, approximate)
+        except JobTimeout:
+            return "timeout", instance, "checking the map took longer than " + str(timeout) + " s"
+        return ("ok" if problem is None else "failed"), instance, problem
+    finally:
+        signal.alarm(0)
+
+
+def shrinkInstance(instance, fails):
+    """Shrink a failing instance by repeatedly removing rows and columns (other
+    than those of the start and end), replacing traps and walls with empty
+    cells and dropping unused traps from the trap domination order, keeping
+    each change for which fails is still true, until none of them helps. The
+    shrunk instance may fail for a different reason than the original one.
+    """
+    trapDominationOrder, rows, start, end = instance
+    rows = [list(row) for row in rows]
+
+    def candidate():
+        return (trapDominationOrder, ["".join(row) for row in rows], start, end)
+
+    progress = True
+    while progress:
+        progress = False
+
+        # remove rows
+        y = 0
+        while y < len(rows) and len(rows) > 1:
+            if y in (start[1], end[1]):
+                y += 1
+                continue
+            removed = rows.pop(y)
+            oldStart, oldEnd = start, end
+            start = (start[0], start[1] - (start[1] > y))
+            end = (end[0], end[1] - (end[1] > y))
+            if fails(candidate()):
+                progress = True
+            else:
+                rows.insert(y, removed)
+                start, end = oldStart, oldEnd
+                y += 1
+
+        # remove columns
+        x = 0
+        while x < len(rows[0]) and len(rows[0]) > 1:
+            if x in (start[0], end[0]):
+                x += 1
+                continue
+            removed = [row.pop(x) for row in rows]
+            oldStart, oldEnd = start, end
+            start = (start[0] - (start[0] > x), start[1])
+            end = (end[0] - (end[0] > x), end[1])
+            if fails(candidate()):
+                progress = True
+            else:
+                for row, value in zip(rows, removed):
+                    row.insert(x, value)
+                start, end = oldStart, oldEnd
+                x += 1
+
+        # replace traps, then walls with empty cells
+        for simplified in [lambda value: value not in "ox", lambda value: value == 'x']:
+            for y, row in enumerate(rows):
+                for x, value in enumerate(row):
+                    if simplified(value):
+                        row[x] = 'o'
+                        if fails(candidate()):
+                            progress = True
+                        else:
+                            row[x] = value
+
+    # drop the traps that no longer occur on the map
+    used = set(value for row in rows for value in row)
+    shortened = "".join(trap for trap in trapDominationOrder if trap in used)
+    if shortened and shortened != trapDominationOrder:
+        if fails((shortened, ["".join(row) for row in rows], start, end)):
+            trapDominationOrder = shortened
+
+    return candidate()
+
+
+def saveInstance(instance, directory, prefix):
+    """Save an instance in the input format of boobytraps.py as PREFIXN.txt in
+    a directory, with N the smallest number not taken yet, returning the
+    filename. The directory is created if it doesn't exist.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for i in itertools.count():
+        filename = os.path.join(directory, prefix + str(i) + ".txt")
+        if not os.path.exists(filename):
+            break
+    with open(filename, "w") as f:
+        f.write("\n".join(instanceLines(instance)) + "\n")
+    return filename
+
+
+def runGoldenChecks():
+    """Run tombraider.sh on the sample inputs with known outputs, returning the
+    sample inputs for which it fails.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    failed = []
+    with open(os.devnull, "w") as devnull:
+        for input, output in GOLDEN:
+            if subprocess.call(["bash", "tombraider.sh", "-i", input, "-o", output], cwd=directory, stdout=devnull, stderr=devnull) != 0:
+                failed.append(input)
+    return failed
+
+
+def main():
+    # process options
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=sorted(CANDIDATES), help="candidate engine to check, approximate engines like hierarchical require --approximate (default: statespace)")
+    parser.set_defaults(engine="statespace")
+    parser.add_argument("--reference", choices=sorted(ENGINES), help="engine whose answers are trusted (default: reference)")
+    parser.set_defaults(reference="reference")
+    parser.add_argument("--approximate", action="store_true", help="accept longer paths than those found by the reference engine (but not shorter ones), e.g. for the hierarchical engine")
+    parser.add_argument("-n", dest="count", type=int, help="number of maps to generate (default: 1000)")
+    parser.set_defaults(count=1000)
+    parser.add_argument("--maxsize", type=int, help="maximum map width/height, widths and heights are drawn uniformly from 1 to this, leaving out 1x1 maps (default: 50)")
+    parser.set_defaults(maxsize=50)
+    parser.add_argument("--modes", type=str, help="comma-separated list of map generation modes (default: random,dungeon)")
+    parser.set_defaults(modes="random,dungeon")
+    parser.add_argument("--complexities", type=str, help="comma-separated list of complexities (default: 1,5,10,20)")
+    parser.set_defaults(complexities="1,5,10,20")
+    parser.add_argument("--seed", type=str, help="prefix of the seeds of the generated maps, the same prefix always yields the same maps (default: fuzz)")
+    parser.set_defaults(seed="fuzz")
+    parser.add_argument("--numpy", action="store_true", help="generate maps using NumPy (see gravedigger.py -h)")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--timeout", type=int, help="seconds after which generating and checking a map is given up, which counts as a failure unless gravedigger.py is still generating the map (default: 60)")
+    parser.set_defaults(timeout=60)
+    parser.add_argument("--output", metavar="DIR", help="directory to save the shrunk failing maps in (default: current directory)")
+    parser.set_defaults(output=".")
+    parser.add_argument("--prefix", type=str, help="prefix of the filenames of the shrunk failing maps, followed by a number (default: fuzzinput)")
+    parser.set_defaults(prefix="fuzzinput")
+    parser.add_argument("--noshrink", action="store_true", help="save failing maps without shrinking them")
+    parser.add_argument("--nogolden", action="store_true", help="don't run tombraider.sh on the sample inputs with known outputs")
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    complexities = [float(i) for i in args.complexities.split(",")]
+    for mode in modes:
+        if mode not in ["random", "dungeon"]:
+            parser.error("unknown mode: " + mode)
+    for complexity in complexities:
+        if complexity <= 0:
+            parser.error("complexities must be positive")
+    if args.count < 0 or args.maxsize < 2 or args.timeout < 1:
+        parser.error("-n must not be negative, --maxsize must be at least 2 and --timeout must be positive")
+    if args.engine in APPROXIMATE_ENGINES and not args.approximate:
+        parser.error("--engine " + args.engine + " requires --approximate")
+    if args.numpy and gravedigger.numpy is None:
+        parser.error("--numpy requires NumPy")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be positive")
+
+    # the golden checks test boobytraps.py as a whole
+    failures = 0
+    if not args.nogolden:
+        for input in runGoldenChecks():
+            sys.stderr.write("tombraider.sh failed on " + input + "\n")
+            failures += 1
+
+    # check the sample inputs
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for filename in sorted(glob.glob(os.path.join(directory, "sampleinput*.txt"))):
+        with open(filename) as f:
+            lines = [line.strip() for line in f]
+        height = int(lines[1].split()[1])
+        instance = (lines[0], lines[2:height+2], tuple(int(i) for i in lines[height+2].split()), tuple(int(i) for i in lines[height+3].split()))
+        problem = checkInstance(instance, args.engine, args.reference, args.approximate)
+        if problem is not None:
+            sys.stderr.write(os.path.basename(filename) + ": " + problem + "\n")
+            failures += 1
+
+    # generate and check maps in parallel, in a reproducible order (leaving
+    # out 1x1 maps, on which start and end can't differ)
+    rand = random.Random(args.seed)
+    jobs = []
+    for i in xrange(args.count):
+        width, height = 1, 1
+        while width * height < 2:
+            width, height = rand.randint(1, args.maxsize), rand.randint(1, args.maxsize)
+        jobs.append((width, height, rand.choice(modes), rand.choice(complexities), args.seed + "-" + str(i), args.engine, args.reference, args.approximate, args.numpy, args.timeout))
+
+    if args.workers == 1:
+        pool = None
+        results = itertools.imap(generateAndCheck, jobs)
+    else:
+        pool = multiprocessing.Pool(args.workers)
+        results = pool.imap(generateAndCheck, jobs, chunksize=8)
+
+    fails = lambda instance: checkInstance(instance, args.engine, args.reference, args.approximate) is not None
+    skipped = 0
+    try:
+        for job, (status, instance, problem) in itertools.izip(jobs, results):
+            if status == "ok":
+                continue
+            width, height, mode, complexity, seed = job[:5]
+            description = str(width) + "x" + str(height) + " " + mode + " map with complexity " + str(complexity) + " and seed " + seed + ": " + problem
+            if status == "skipped":
+                skipped += 1
+                sys.stderr.write(description + " (skipped)\n")
+                continue
+
+            # maps taking too long to check are saved as they are
+            failures += 1
+            if status == "failed" and not args.noshrink:
+                instance = shrinkInstance(instance, fails)
+                description += " (shrunk: " + (checkInstance(instance, args.engine, args.reference, args.approximate) or problem) + ")"
+            filename = saveInstance(instance, args.output, args.prefix)
+            sys.stderr.write(description + " (saved as " + filename + ")\n")
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    print "Checked " + str(args.count - skipped) + " maps (skipping " + str(skipped) + " that couldn't be generated) and the sample inputs using " + args.engine + " against " + args.reference + ": " + str(failures) + " failures"
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
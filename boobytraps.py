@@ -6,27 +6,68 @@
 #
 # Usage: Either of the following three options will work:
 #
-#        ./boobytraps.py [-v | -v1 | -v2] INPUT_FILE
-#        cat INPUT_FILE | ./boobytraps.py [-v | -v1 | -v2]
-#        ./gravedigger.py [OPTIONS] WIDTH HEIGHT | ./boobytraps.py [-v | -v1 | -v2]
+#        ./boobytraps.py [-v | -v1 | -v2] [OPTIONS] INPUT_FILE
+#        cat INPUT_FILE | ./boobytraps.py [-v | -v1 | -v2] [OPTIONS]
+#        ./gravedigger.py [OPTIONS] WIDTH HEIGHT | ./boobytraps.py [-v | -v1 | -v2] [OPTIONS]
 #
 #        -v  enables output of the map and highlighted path.
 #        -v1 is equivalent to -v.
 #        -v2 additionally highlights visited fields and, if no path from start
 #            to end is found, the "best effort" path.
+#
+#        For OPTIONS, see ./boobytraps.py -h.
 
+import argparse
+import array
+import cProfile
+import collections
 import fileinput
+import functools
+import hashlib
+import heapq
+import json
+import mmap
+import multiprocessing
 import copy
+import os
+import pstats
+import socket
+import SocketServer
+import struct
 import sys
+import threading
+import time
+import zlib
 import Queue
 
+# NumPy is optional: it's required by the wavefront engine and speeds up building
+# graphs and labeling components of large maps. Importing it takes longer than
+# solving small maps, so it's only imported on first use (see importNumPy)
+numpy = None
+numpyMissing = False
+
+# maps with fewer cells are processed without NumPy
+NUMPY_MIN_CELLS = 40000
+
+
+def importNumPy():
+    """Import NumPy unless it has been imported already, returning the module,
+    or None if it isn't installed.
+    """
+    global numpy, numpyMissing
+    if numpy is None and not numpyMissing:
+        try:
+            import numpy
+        except ImportError:
+            numpyMissing = True
+    return numpy
+
 
-class Cell:
+class Cell(object):
     """Cell with x and y coordinates and value."""
 
-    x = 0
-    y = 0
-    value = 'x'
+    # no per-instance dictionary: there's one cell object per field of the map
+    __slots__ = ('x', 'y', 'value')
 
     def __init__(self, x, y, value):
         self.x = x
@@ -36,8 +77,13 @@ class Cell:
     def __eq__(self, other):
         return self.x == other.x and self.y == other.y and self.value == other.value
 
+    def __ne__(self, other):
+        return not self == other
+
     def __hash__(self):
-        return hash(self.x * self.y * self.value)
+        # distinct for all cells of maps less than 1000003 cells wide, and
+        # spread well across the buckets of sets and dictionaries
+        return self.y * 1000003 + self.x
 
     def __str__(self):
         return 'x: ' + str(self.x) + ', y: ' + str(self.y) + ', value: ' + str(self.value)
@@ -62,9 +108,7 @@ class Traps:
         """Get the index (starting with 1) of a trap, or 0 if the given value is
         not a trap.
         """
-        if self.isTrap(value):
-            return self.trapDominationLookup[value]
-        return 0
+        return self.trapDominationLookup.get(value, 0)
 
     def getValue(self, index):
         """Get the value of a trap represented by an index, or '0' if the index
@@ -76,7 +120,7 @@ class Traps:
 
     def isTrap(self, value):
         """Check if a cell value is a trap."""
-        return value in self.trapDominationOrder
+        return value in self.trapDominationLookup
 
 
 class Map:
@@ -88,6 +132,7 @@ class Map:
     traps = None
     width = 0
     height = 0
+    cells = None
 
     def __init__(self, width, height, map, traps):
         self.width = width
@@ -104,61 +149,94 @@ class Map:
     def __str__(self):
         return 'map: ' + str(self.map) + ', traps: ' + str(self.traps)
 
-    def prettyprint(self, start, end, path=[], visited=[]):
+    def prettyprint(self, start, end, path=[], visited=[], distances=None):
         """Print the map with coordinate axes and different colors for different
         cell types. Highlight start, end, a path in the map as well as visited
-        cells.
+        cells. If a distance field (see distanceField) is given, shade reachable
+        cells by their distance from the start instead of highlighting visited
+        cells. Path and visited cells are looked up by cell id, the output is
+        built in one buffer and escape codes are only emitted when the style
+        changes between neighboring fields, so this takes linear time.
         """
         xLabel = "  0123->x"
         yLabel = "0123|vy"
+        reset = "\033[0m"
+
+        # yellow (close to the start) to red (far away from the start)
+        heatColors = [226, 220, 214, 208, 202, 196]
+        if distances is not None:
+            maxDistance = max(max(distances), 1)
+
+        pathIds = set(cell.y * self.width + cell.x for cell in path)
+        visitedIds = set(cell.y * self.width + cell.x for cell in visited)
+        pathComplete = end in path
+        startId = start.y * self.width + start.x
+        endId = end.y * self.width + end.x
+        trapValues = set(self.traps.trapDominationOrder)
 
         # print x-axis label
-        print xLabel
+        out = [xLabel, "\n"]
 
         # print row
         for y, row in enumerate(self.map):
             # print y-axis label
             if y < len(yLabel):
-                sys.stdout.write(yLabel[y] + " ")
+                out.append(yLabel[y] + " ")
             else:
-                sys.stdout.write("  ")
+                out.append("  ")
 
-            # print all fields in the current row
+            # print all fields in the current row, starting a new run of fields
+            # whenever the style changes
+            style = None
             for x, field in enumerate(row):
+                id = y * self.width + x
                 prefix = "\033[30m\033[48;5;231m"  # default: black text on white background
-                suffix = "\033[0m"
 
                 # highlight empty fields
                 if field == 'o':
                     prefix += "\033[37m"  # light gray
 
                 # highlight visited fields
-                if Cell(x, y, self.getAt(x, y)) in visited:
+                if id in visitedIds:
                     prefix += "\033[48;5;255m"  # very light gray background
 
+                # shade reachable fields by distance
+                if distances is not None and distances[id] >= 0:
+                    heat = distances[id] * (len(heatColors) - 1) / maxDistance
+                    prefix += "\033[48;5;" + str(heatColors[heat]) + "m"
+
                 # highlight path depending on completeness
-                if Cell(x, y, self.getAt(x, y)) in path:
-                    if end in path:
+                if id in pathIds:
+                    if pathComplete:
                         prefix += "\033[42m"  # green background
                     else:
                         prefix += "\033[90m\033[47m"  # dark gray text on light gray background
 
                 # highlight traps
-                if self.traps.isTrap(field):
+                if field in trapValues:
                     prefix += "\033[31m"  # red
 
                 # highlight start and end
-                if Cell(x, y, self.getAt(x, y)) == start:
+                if id == startId:
                     prefix += "\033[1m\033[44m"  # bold on blue background
-                if Cell(x, y, self.getAt(x, y)) == end:
+                if id == endId:
                     prefix += "\033[1m\033[4m\033[41m"  # bold underlined on red background
 
                 # highlight end differently if it is a trap to maintain readability
-                if Cell(x, y, self.getAt(x, y)) == end and self.traps.isTrap(field):
+                if id == endId and field in trapValues:
                     prefix += "\033[45m"  # pink background
 
-                sys.stdout.write(prefix + field + suffix)
-            print
+                if prefix != style:
+                    if style is not None:
+                        out.append(reset)
+                    out.append(prefix)
+                    style = prefix
+                out.append(field)
+            if style is not None:
+                out.append(reset)
+            out.append("\n")
+
+        sys.stdout.write("".join(out))
 
     def getAdjacent(self, cell):
         """Get the (up to four) cells adjacent to a given cell. Note that the
@@ -168,25 +246,25 @@ class Map:
 
         # right neighbor
         if cell.x < self.width - 1:
-            candidate = Cell(cell.x + 1, cell.y, self.map[cell.y][cell.x + 1])
+            candidate = self.getCell(cell.x + 1, cell.y)
             if candidate.value != 'x':
                 adj.append(candidate)
 
         # bottom neighbor
         if cell.y < self.height - 1:
-            candidate = Cell(cell.x, cell.y + 1, self.map[cell.y + 1][cell.x])
+            candidate = self.getCell(cell.x, cell.y + 1)
             if candidate.value != 'x':
                 adj.append(candidate)
 
         # left neighbor
         if cell.x > 0:
-            candidate = Cell(cell.x - 1, cell.y, self.map[cell.y][cell.x - 1])
+            candidate = self.getCell(cell.x - 1, cell.y)
             if candidate.value != 'x':
                 adj.append(candidate)
 
         # top neighbor
         if cell.y > 0:
-            candidate = Cell(cell.x, cell.y - 1, self.map[cell.y - 1][cell.x])
+            candidate = self.getCell(cell.x, cell.y - 1)
             if candidate.value != 'x':
                 adj.append(candidate)
 
@@ -196,18 +274,126 @@ class Map:
         """Get the cell value at position x, y."""
         return self.map[y][x]
 
+    def getId(self, x, y):
+        """Get the compact integer id of the cell at position x, y."""
+        return y * self.width + x
+
+    def getCell(self, x, y):
+        """Get the cell at position x, y. Cells are only created once and shared
+        between all callers, so there's one cell object per field at most.
+        """
+        if self.cells is None:
+            self.cells = [None] * (self.width * self.height)
+        cell = self.cells[y * self.width + x]
+        if cell is None:
+            cell = Cell(x, y, self.getAt(x, y))
+            self.cells[y * self.width + x] = cell
+        return cell
+
+    def setAt(self, x, y, value):
+        """Set the cell value at position x, y. The cell object previously
+        returned by getCell for this position is replaced, so graphs computed
+        before are out of date.
+        """
+        self.map[y][x] = value
+        if self.cells is not None:
+            self.cells[y * self.width + x] = None
+
+    def getValues(self):
+        """Get the values of all cells, row by row, as a string (or another
+        sequence of characters supporting the buffer interface) indexed by cell
+        id.
+        """
+        return "".join("".join(row) for row in self.map)
+
+
+class BufferRows(object):
+    """Read-only sequence of the rows of a BufferMap, each of which is only
+    extracted from the buffer when accessed.
+    """
+
+    bufferMap = None
+
+    def __init__(self, bufferMap):
+        self.bufferMap = bufferMap
+
+    def __len__(self):
+        return self.bufferMap.height
+
+    def __getitem__(self, y):
+        m = self.bufferMap
+        if y < 0:
+            y += m.height
+        if not 0 <= y < m.height:
+            raise IndexError("row index out of range")
+        row = m.data[m.offset + y * m.stride:m.offset + y * m.stride + m.width]
+        if isinstance(row, array.array):  # edited map, see BufferMap.setAt
+            return row.tostring()
+        return row
+
+
+class BufferMap(Map):
+    """Map backed by a buffer, e.g. a memory-mapped file, holding the fields one
+    byte per cell and row by row, the first row starting at offset and each
+    following one stride bytes later. No per-row lists are materialized: rows
+    are only extracted from the buffer when the map attribute is accessed. The
+    buffer may be read-only, so it's copied on the first edit (see setAt).
+    """
+
+    data = None
+    offset = 0
+    stride = 0
+
+    def __init__(self, width, height, data, traps, offset=0, stride=None):
+        self.width = width
+        self.height = height
+        self.data = data
+        self.offset = offset
+        self.stride = width if stride is None else stride
+        self.map = BufferRows(self)
+        self.traps = traps
+
+    def getAt(self, x, y):
+        """Get the cell value at position x, y."""
+        return self.data[self.offset + y * self.stride + x]
+
+    def getValues(self):
+        """Get the values of all cells, row by row, without copying them if
+        there's nothing between the rows.
+        """
+        if self.stride == self.width:
+            return buffer(self.data, self.offset, self.width * self.height)
+        return "".join(self.map)
+
+    def setAt(self, x, y, value):
+        """Set the cell value at position x, y like Map.setAt. On the first
+        edit, the fields are copied from the buffer into a character array
+        without gaps between the rows, which backs the map from then on.
+        """
+        if not isinstance(self.data, array.array):
+            self.data = array.array('c', "".join(self.map))
+            self.offset = 0
+            self.stride = self.width
+        self.data[y * self.stride + x] = value
+        if self.cells is not None:
+            self.cells[y * self.width + x] = None
+
 
 class Graph:
-    """Graph represented as an adjacency list."""
+    """Graph represented as an adjacency list, along with the map it has been
+    computed from.
+    """
 
     graph = None
+    map = None
 
     def __init__(self, map):
+        self.map = map
         self.graph = {}
         for y, row in enumerate(map.map):
             for x, field in enumerate(row):
                 if field != 'x':  # ignore wall cells: irrelevant for path finding
-                    cell = Cell(x, y, field)
+                    cell = map.getCell(x, y)
                     self.graph[cell] = map.getAdjacent(cell)
 
     def __str__(self):
@@ -229,109 +415,2612 @@ class Graph:
                 print "\t" + arrow + " " + str(adj)
 
 
-def parseInput(rawInput):
+class CSRGraph(object):
+    """Graph represented in compressed sparse row format, along with the map it
+    has been computed from: cells are identified by their id y * width + x, the
+    ids of the (up to four) cells adjacent to cell i are stored in
+    neighbors[offsets[i]:offsets[i+1]] in the same order as returned by
+    Map.getAdjacent, and values[i] is the value of cell i. Wall cells don't have
+    any neighbors. For engines working with cells, the adjacency list of Graph
+    is computed on first access of the graph attribute.
+    """
+
+    map = None
+    offsets = None
+    neighbors = None
+    values = None
+    adjacencyList = None
+
+    def __init__(self, map):
+        self.map = map
+        width = map.width
+        height = map.height
+        self.values = values = map.getValues()
+
+        # one vectorized pass over the grid of a large map if NumPy is available:
+        # candidate neighbor ids for each direction, or -1 if there is no such
+        # neighbor
+        if width * height >= NUMPY_MIN_CELLS and importNumPy() is not None:
+            ids = numpy.arange(width * height, dtype=numpy.int32).reshape(height, width)
+            open = (numpy.frombuffer(values, dtype=numpy.uint8) != ord('x')).reshape(height, width)
+            candidates = numpy.full((height, width, 4), -1, dtype=numpy.int32)
+            candidates[:, :-1, 0] = numpy.where(open[:, 1:], ids[:, 1:], -1)  # right
+            candidates[:-1, :, 1] = numpy.where(open[1:, :], ids[1:, :], -1)  # bottom
+            candidates[:, 1:, 2] = numpy.where(open[:, :-1], ids[:, :-1], -1)  # left
+            candidates[1:, :, 3] = numpy.where(open[:-1, :], ids[:-1, :], -1)  # top
+            candidates[~open] = -1
+
+            # flattened row by row, the remaining candidates are in CSR order
+            present = candidates.reshape(-1, 4) >= 0
+            offsets = numpy.zeros(width * height + 1, dtype=numpy.int32)
+            numpy.cumsum(present.sum(axis=1), out=offsets[1:])
+            self.offsets = array.array('i', offsets.tostring())
+            self.neighbors = array.array('i', candidates.reshape(-1, 4)[present].tostring())
+            return
+
+        self.offsets = offsets = array.array('i', [0]) * (width * height + 1)
+        self.neighbors = neighbors = array.array('i')
+        for y in xrange(height):
+            for x in xrange(width):
+                i = y * width + x
+                if values[i] != 'x':
+                    if x < width - 1 and values[i + 1] != 'x':
+                        neighbors.append(i + 1)  # right
+                    if y < height - 1 and values[i + width] != 'x':
+                        neighbors.append(i + width)  # bottom
+                    if x > 0 and values[i - 1] != 'x':
+                        neighbors.append(i - 1)  # left
+                    if y > 0 and values[i - width] != 'x':
+                        neighbors.append(i - width)  # top
+                offsets[i + 1] = len(neighbors)
+
+    def __str__(self):
+        return 'offsets: ' + str(self.offsets) + ', neighbors: ' + str(self.neighbors)
+
+    @property
+    def graph(self):
+        """The adjacency list of Graph, computed on first access."""
+        if self.adjacencyList is None:
+            self.adjacencyList = Graph(self.map).graph
+        return self.adjacencyList
+
+    def prettyprint(self):
+        """Print the graph in a readable way."""
+        Graph(self.map).prettyprint()
+
+    def getCell(self, id):
+        """Get the cell with the given id."""
+        return self.map.getCell(id % self.map.width, id / self.map.width)
+
+
+def parseMap(input, graphClass=None, stats=None, buildGraph=True):
+    """From the input lines (without line breaks), extract the traps and map
+    and compute the corresponding graph, a CSRGraph unless another graph class
+    is given (or None if buildGraph is false). If a dictionary is given as
+    stats, the time taken to compute the graph is stored in it.
+    """
+    traps = Traps(input[0])
+
+    mapWidth, mapHeight = [int(i) for i in input[1].split(" ")]
+    map = Map(mapWidth, mapHeight, input[2:mapHeight+2], traps)
+
+    graph = None
+    if buildGraph:
+        t = time.time()
+        graph = (graphClass or CSRGraph)(map)
+        if stats is not None:
+            stats.setdefault('time', {})['graph'] = time.time() - t
+
+    return traps, map, graph
+
+
+# binary map format: header (see BINARY_HEADER) followed by the fields, one
+# byte per cell and row by row
+BINARY_MAGIC = "BTMAP\x01"
+BINARY_HEADER = struct.Struct("<6sB26sIIIIII")  # magic, trap domination order (length and characters), width, height, start, end
+
+
+def isBinaryMap(filename):
+    """Check if a file contains a map in the binary map format. Like for
+    fileinput, "-" stands for stdin, which is never considered binary.
+    """
+    if filename == "-":
+        return False
+    with open(filename, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def writeBinaryMap(f, trapDominationOrder, width, height, rows, start, end):
+    """Write a map given as rows of fields (strings or lists of characters) and
+    start and end coordinates, given as (x, y) tuples, to a file in the binary
+    map format.
+    """
+    f.write(BINARY_HEADER.pack(BINARY_MAGIC, len(trapDominationOrder), trapDominationOrder, width, height, start[0], start[1], end[0], end[1]))
+    for row in rows:
+        f.write("".join(row))
+
+
+def parseBinaryMap(data, offset=0, stats=None, buildGraph=True):
+    """Extract the traps, map (and compute the corresponding graph unless
+    buildGraph is false), start and end from a map in the binary map format
+    starting at some offset of a buffer, just like parseInput. The map is backed
+    by the buffer instead of a copy.
+    """
+    t = time.time()
+    magic, trapCount, trapDominationOrder, width, height, startX, startY, endX, endY = BINARY_HEADER.unpack_from(data, offset)
+    if magic != BINARY_MAGIC:
+        raise ValueError("not a binary map")
+    if len(data) < offset + BINARY_HEADER.size + width * height:
+        raise ValueError("truncated binary map")
+
+    traps = Traps(trapDominationOrder[:trapCount])
+    map = BufferMap(width, height, data, traps, offset + BINARY_HEADER.size)
+    start = map.getCell(startX, startY)
+    end = map.getCell(endX, endY)
+
+    if stats is not None:
+        stats.setdefault('time', {})['parse'] = time.time() - t
+
+    graph = None
+    if buildGraph:
+        t = time.time()
+        graph = CSRGraph(map)
+        if stats is not None:
+            stats['time']['graph'] = time.time() - t
+
+    return traps, map, graph, start, end
+
+
+def loadBinaryMap(filename, stats=None, buildGraph=True):
+    """Memory-map a file in the binary map format and parse it. The map is
+    backed by the memory-mapped file, so loading it takes constant time: only
+    computing the graph depends on the size of the map.
+    """
+    with open(filename, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return parseBinaryMap(data, stats=stats, buildGraph=buildGraph)
+
+
+def parseTextMap(data, stats=None, buildGraph=True):
+    """Extract the traps, map (and compute the corresponding graph unless
+    buildGraph is false), start and end from an input in the text format held
+    in a buffer (a string or a memory-mapped file), just like parseInput, but
+    without splitting it into lines: if all rows have the same line break, the
+    map is backed by the buffer, its rows starting stride bytes apart. Otherwise
+    (e.g. if there's whitespace at the end of some rows), the stripped rows are
+    copied into one string. Raises a ValueError if the map doesn't match its
+    dimensions or the start or end isn't on the map.
+    """
+    t = time.time()
+
+    # the first two lines hold the trap domination order and the dimensions
+    lineEnd = data.find("\n")
+    traps = Traps(data[:lineEnd].strip())
+    offset = lineEnd + 1
+    lineEnd = data.find("\n", offset)
+    dimensions = data[offset:lineEnd].split()
+    if len(dimensions) != 2:
+        raise ValueError("expected the map width and height on the second line")
+    width, height = [int(i) for i in dimensions]
+    if width < 1 or height < 1:
+        raise ValueError("map width and height must be positive")
+    offset = lineEnd + 1
+
+    # check if each row is followed by the same line break, making sure there's
+    # no line break within the rows
+    lineBreak = data[offset + width:offset + width + 2]
+    if lineBreak.startswith("\n"):
+        lineBreak = "\n"
+    elif lineBreak != "\r\n":
+        lineBreak = None
+    if lineBreak is not None:
+        stride = width + len(lineBreak)
+        if len(data) < offset + height * stride:
+            lineBreak = None
+    if lineBreak is not None:
+        for y in xrange(height):
+            rowStart = offset + y * stride
+            if data.find("\n", rowStart, rowStart + width) >= 0 or data[rowStart + width:rowStart + stride] != lineBreak:
+                lineBreak = None
+                break
+
+    if lineBreak is not None:
+        map = BufferMap(width, height, data, traps, offset, stride)
+        lines = data[offset + height * stride:].split("\n", 2)
+    else:
+        lines = data[offset:].split("\n")
+        rows = [line.strip() for line in lines[:height]]
+        for y, row in enumerate(rows):
+            if len(row) != width:
+                raise ValueError("row " + str(y) + " has " + str(len(row)) + " fields instead of " + str(width))
+        if len(rows) < height:
+            raise ValueError("expected " + str(height) + " rows, got " + str(len(rows)))
+        map = BufferMap(width, height, "".join(rows), traps)
+        lines = lines[height:]
+
+    # the map is followed by the start and end
+    if len(lines) < 2:
+        raise ValueError("expected the start and end after the map")
+    startX, startY = [int(i) for i in lines[0].split()]
+    endX, endY = [int(i) for i in lines[1].split()]
+    for x, y in [(startX, startY), (endX, endY)]:
+        if not (0 <= x < width and 0 <= y < height):
+            raise ValueError("start or end outside of the map")
+    start = map.getCell(startX, startY)
+    end = map.getCell(endX, endY)
+
+    if stats is not None:
+        stats.setdefault('time', {})['parse'] = time.time() - t
+
+    graph = None
+    if buildGraph:
+        t = time.time()
+        graph = CSRGraph(map)
+        if stats is not None:
+            stats['time']['graph'] = time.time() - t
+
+    return traps, map, graph, start, end
+
+
+def loadTextMap(filename=None, stats=None, buildGraph=True):
+    """Read an input in the text format from a file, which is memory-mapped, or
+    from stdin if no filename (or "-") is given, and parse it using
+    parseTextMap.
+    """
+    if filename is None or filename == "-":
+        data = sys.stdin.read()
+    else:
+        with open(filename, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                data = ""
+            else:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return parseTextMap(data, stats=stats, buildGraph=buildGraph)
+
+
+def parseQueries(rawInput):
     """From the raw input read using fileinput.input() or similar, extract the
-    traps, map (and compute the corresponding graph), start and end.
+    traps, map (and compute the corresponding graph) and any number of queries
+    following the map, one per line, each consisting of the coordinates of a
+    start and an end: "STARTX STARTY ENDX ENDY".
     """
 
-    # discard line breaks
+    # discard line breaks and empty lines after the map
     input = []
     for line in rawInput:
         input.append(line.strip())
 
     # parse input
-    traps = Traps(input[0])
+    traps, map, graph = parseMap(input)
 
-    mapWidth, mapHeight = [int(i) for i in input[1].split(" ")]
-    map = Map(mapWidth, mapHeight, input[2:mapHeight+2], traps)
+    queries = []
+    for line in input[map.height+2:]:
+        if line:
+            startX, startY, endX, endY = [int(i) for i in line.split()]
+            queries.append(((startX, startY), (endX, endY)))
 
-    graph = Graph(map)
+    return traps, map, graph, queries
+
+
+def parseInput(rawInput, stats=None, buildGraph=True):
+    """From the raw input read using fileinput.input() or similar, extract the
+    traps, map (and compute the corresponding graph unless buildGraph is false),
+    start and end. If a dictionary is given as stats, the time taken for parsing
+    (including reading the input) and for computing the graph is stored in it.
+    """
+    t = time.time()
+
+    # discard line breaks
+    input = []
+    for line in rawInput:
+        input.append(line.strip())
+
+    # parse input
+    traps, map, graph = parseMap(input, stats=stats, buildGraph=buildGraph)
+    mapHeight = map.height
 
     startX, startY = [int(i) for i in input[mapHeight+2].split(" ")]
-    startValue = map.getAt(startX, startY)
-    start = Cell(startX, startY, startValue)
+    start = map.getCell(startX, startY)
 
     endX, endY = [int(i) for i in input[mapHeight+3].split(" ")]
-    endValue = map.getAt(endX, endY)
-    end = Cell(endX, endY, endValue)
+    end = map.getCell(endX, endY)
+
+    if stats is not None:
+        times = stats.setdefault('time', {})
+        times['parse'] = time.time() - t - times.get('graph', 0)
 
     return traps, map, graph, start, end
 
 
-def raidTomb(graph, traps, start, end):
+def parseInstances(rawInput):
+    """From raw input containing any number of concatenated instances (possibly
+    separated by empty lines), lazily extract the lines (without line breaks)
+    of one instance at a time, to be passed on to parseInput. Raises a
+    ValueError if an instance is incomplete or has no valid dimension line.
+    """
+    lines = (line.strip() for line in rawInput)
+    count = 0
+    for line in lines:
+        if not line:
+            continue
+        count += 1
+
+        # the second line of an instance determines how many lines follow
+        instance = [line]
+        try:
+            instance.append(next(lines))
+            dimensions = instance[1].split(" ")
+            if len(dimensions) != 2 or not all(d.isdigit() for d in dimensions):
+                raise ValueError("instance " + str(count) + ": invalid dimension line: " + instance[1])
+            mapHeight = int(dimensions[1])
+            for i in xrange(mapHeight + 2):
+                instance.append(next(lines))
+        except StopIteration:
+            raise ValueError("instance " + str(count) + " is incomplete")
+        yield instance
+
+
+def raidTomb(graph, traps, start, end, stats=None):
     """Find the shortest path between start and end cells ("raid the tomb")
     using modified breadth-first search, returning the number of moves, the path
     (or, if no path from start to end is found, the "best effort" path) and a
-    set of all visited cells.
+    set of all visited cells. If a dictionary is given as stats, the number of
+    expanded queue frames and further counters (see searchStats) are stored in
+    it, and if it contains a sampleInterval, the queue length and visited set
+    sizes are sampled every sampleInterval expanded queue frames.
     """
+    width = graph.map.width
+    height = graph.map.height
     graph = graph.graph
     q = Queue.Queue()
 
-    # initialize visited structure
+    # initialize visited structure: a set of cells per trap level and, for each
+    # cell id, a bitmask of the levels whose set contains the cell
     visited = {}
     visited[0] = set()
     for i in traps.trapDominationLookup.values():
         visited[i] = set()
+    visitedLevels = [0] * (width * height)
 
-    # add start to queue
-    c = {'cell': start, 'path': [start], 'triggered': traps.getIndex(start.value)}
+    # add start to queue, along with a bitmask of the levels of the visited
+    # sets a neighbor is checked against: level 0 if the path starts on an
+    # empty cell, and the level of each other cell of the path that's not empty
+    c = {'cell': start, 'path': [start], 'triggered': traps.getIndex(start.value), 'levels': 1 << traps.getIndex(start.value)}
     visited[c['triggered']].add(c['cell'])
+    visitedLevels[start.y * width + start.x] |= 1 << c['triggered']
     q.put(c)
 
+    expanded = 0
+    peakQueue = 0
+    rejectedVisited = rejectedTrapOrder = 0
+    sampleInterval = stats.get('sampleInterval') if stats is not None else None
+    samples = []
     while not q.empty():
+        if stats is not None:
+            peakQueue = max(peakQueue, q.qsize())
+            if sampleInterval and expanded % sampleInterval == 0:
+                samples.append(searchSample(expanded, q.qsize(), [len(visited[i]) for i in sorted(visited)]))
 
         # get new cell
         c = q.get()
+        expanded += 1
 
         # add eligible neighbors to queue and check if one of them is the end
         for neighbor in graph[c['cell']]:
 
-            # make sure neighbor has not been visited yet
-            neighborVisited = False
-            if c['path'][0].value == 'o':
-                neighborVisited = neighbor in visited[0]
-            for d in c['path']:
-                if neighborVisited:
-                    break
-                if d.value != 'o':
-                    neighborVisited = neighborVisited or neighbor in visited[traps.getIndex(d.value)]
-
-            if not neighborVisited:
+            # make sure neighbor has not been visited yet, i.e. isn't in the
+            # visited set of any level of the path
+            if visitedLevels[neighbor.y * width + neighbor.x] & c['levels']:
+                rejectedVisited += 1
+            else:
 
                 # make sure the neigbor can be visited and update maximum triggered trap
                 triggered = c['triggered']
-                if traps.isTrap(neighbor.value):
-                    v = neighbor.value
-                    if traps.getIndex(v) <= triggered:  # trap already in path
+                v = neighbor.value
+                index = traps.getIndex(v)
+                if index:
+                    if index <= triggered:  # trap already in path
+                        rejectedTrapOrder += 1
                         continue
-                    triggered = traps.getIndex(v)
+                    triggered = index
 
                 # create new queue frame
-                n = {'cell': neighbor, 'path': c['path'] + [neighbor], 'triggered': triggered}
+                levels = c['levels'] | (1 << index) if v != 'o' else c['levels']
+                n = {'cell': neighbor, 'path': c['path'] + [neighbor], 'triggered': triggered, 'levels': levels}
 
                 # check if the end has been reached
                 if neighbor == end:
+                    if stats is not None:
+                        searchStats(stats, expanded, expanded + q.qsize() + 1, peakQueue, visited, rejectedVisited, rejectedTrapOrder, samples)
                     return len(n['path']) - 1, n['path'], set().union(*visited.values())
                 else:
                     q.put(n)
                     visited[n['triggered']].add(neighbor)
+                    visitedLevels[neighbor.y * width + neighbor.x] |= 1 << n['triggered']
 
     # return longest/"best effort" path
+    if stats is not None:
+        searchStats(stats, expanded, expanded, peakQueue, visited, rejectedVisited, rejectedTrapOrder, samples)
     return -1, c['path'], set().union(*visited.values())
 
 
-def main():
-    # process verbose options
-    verbose = len(sys.argv) > 1 and sys.argv[1] in ["-v", "-v1", "-v2"]
-    verbose2 = verbose and sys.argv[1] == "-v2"
-    if verbose:
-        del sys.argv[1]
+def searchSample(expanded, queueLength, visited):
+    """A sample of the progress of a search taken before expanding a state."""
+    return {'expanded': expanded, 'queue': queueLength, 'visited': visited}
 
-    # parse input
-    traps, map, graph, start, end = parseInput(fileinput.input())
+
+def searchStats(stats, expanded, enqueued, peakQueue, visited, rejectedVisited, rejectedTrapOrder, samples):
+    """Store the counters describing a search in stats: the number of states
+    expanded and enqueued (including the start, and the end if it has been
+    reached), the peak number of states waiting in the queue, the size of each
+    visited set (by trap level, 0 for none and then the traps in domination
+    order) and the number of neighbors rejected because they had already been
+    visited or because of the trap domination order. Samples (see searchSample)
+    are only stored if a sampleInterval was requested.
+    """
+    stats['expanded'] = expanded
+    stats['enqueued'] = enqueued
+    stats['peakQueue'] = peakQueue
+    stats['visited'] = [len(visited[i]) for i in sorted(visited)]
+    stats['rejectedVisited'] = rejectedVisited
+    stats['rejectedTrapOrder'] = rejectedTrapOrder
+    if stats.get('sampleInterval'):
+        stats['samples'] = samples
+
+
+def rebuildPath(cells, parents, state):
+    """Rebuild the path leading to a state by following the parent pointers
+    back to the start.
+    """
+    path = []
+    while state >= 0:
+        path.append(cells[state])
+        state = parents[state]
+    path.reverse()
+    return path
+
+
+def raidTombStateSpace(graph, traps, start, end, stats=None):
+    """Find the shortest path between start and end cells exactly like
+    raidTomb, but without copying the path into every queue frame: each state
+    (cell, maximum triggered trap) is identified by its position in a few flat
+    arrays holding the cell id, the parent state, the maximum triggered trap
+    and the set of trap levels on the path to it (as a bit mask). Since states
+    are appended in the order they are enqueued, these arrays double as the
+    queue. The path is only rebuilt once the search is over. Neighbors are taken
+    from the arrays of a CSRGraph, which is computed first if another kind of
+    graph is given. Returns the same number of moves, path (or "best effort"
+    path) and set of visited cells as raidTomb, and stores the same counters
+    in stats (if given). Apart from the neighbors rejected because of the trap
+    domination order, which are rare, these are only derived from the arrays
+    once the search is over, so they cost nothing while searching.
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph.map)
+    offsets = graph.offsets
+    neighbors = graph.neighbors
+    values = graph.values
+    startId = graph.map.getId(start.x, start.y)
+    endId = graph.map.getId(end.x, end.y) if end.value != 'x' else -1  # walls can't be reached
+
+    # initialize visited structure (sets of cell ids)
+    visited = {}
+    visited[0] = set()
+    for i in traps.trapDominationLookup.values():
+        visited[i] = set()
+
+    # the visited sets that need to be checked for each bit mask of trap levels
+    # on a path, computed once per distinct mask
+    maskVisited = {}
+
+    # add start to state arrays: raidTomb checks visited[0] for paths starting
+    # on an empty cell and visited[i] for each cell with trap index i on the path
+    triggered = traps.getIndex(start.value)
+    cells = [startId]
+    parents = [-1]
+    triggers = [triggered]
+    masks = [1 << triggered]
+    visited[triggered].add(startId)
+
+    c = 0
+    head = 0
+    rejectedTrapOrder = 0
+    while head < len(cells):
+
+        # get new state
+        c = head
+        head += 1
+        cell = cells[c]
+        mask = masks[c]
+        if mask not in maskVisited:
+            maskVisited[mask] = [visited[i] for i in visited if mask & (1 << i)]
+        pathVisited = maskVisited[mask]
+
+        # add eligible neighbors to states and check if one of them is the end
+        for i in xrange(offsets[cell], offsets[cell + 1]):
+            neighbor = neighbors[i]
+
+            # make sure neighbor has not been visited yet at a trap level on the path
+            neighborVisited = False
+            for v in pathVisited:
+                if neighbor in v:
+                    neighborVisited = True
+                    break
+
+            if not neighborVisited:
+
+                # make sure the neigbor can be visited and update maximum triggered trap
+                value = values[neighbor]
+                triggered = triggers[c]
+                neighborMask = mask
+                if traps.isTrap(value):
+                    if traps.getIndex(value) <= triggered:  # trap already in path
+                        rejectedTrapOrder += 1
+                        continue
+                    triggered = traps.getIndex(value)
+                if value != 'o':
+                    neighborMask |= 1 << traps.getIndex(value)
+
+                # create new state
+                cells.append(neighbor)
+                parents.append(c)
+                triggers.append(triggered)
+                masks.append(neighborMask)
+
+                # check if the end has been reached
+                if neighbor == endId:
+                    if stats is not None:
+                        stateSpaceStats(stats, graph, cells, parents, triggers, head, i - offsets[cell] + 1, visited, rejectedTrapOrder)
+                    path = [graph.getCell(id) for id in rebuildPath(cells, parents, len(cells) - 1)]
+                    return len(path) - 1, path, set(graph.getCell(id) for id in set().union(*visited.values()))
+                else:
+                    visited[triggered].add(neighbor)
+
+    # return longest/"best effort" path
+    if stats is not None:
+        stateSpaceStats(stats, graph, cells, parents, triggers, head, offsets[cells[c] + 1] - offsets[cells[c]], visited, rejectedTrapOrder)
+    path = [graph.getCell(id) for id in rebuildPath(cells, parents, c)]
+    return -1, path, set(graph.getCell(id) for id in set().union(*visited.values()))
+
+
+def stateSpaceStats(stats, graph, cells, parents, triggers, expanded, lastChecked, visited, rejectedTrapOrder):
+    """Derive the counters stored by searchStats (and the samples, if requested)
+    from the state arrays of raidTombStateSpace after the search, given the
+    number of neighbors checked while expanding the last state.
+    """
+    sampleInterval = stats.get('sampleInterval')
+    samples = []
+
+    # since states are appended in the order they are enqueued, the queue holds
+    # all states whose parent has been expanded, but which haven't been expanded
+    # themselves, before each state is expanded, and each of them has been added
+    # to the visited set of its trap level when it was enqueued (a trap cell can
+    # be enqueued more than once at the level of its own trap, though)
+    peakQueue = 1
+    appended = 1
+    added = set([(triggers[0], cells[0])])
+    visitedSizes = [0] * len(visited)
+    visitedSizes[triggers[0]] = 1
+    for c in xrange(expanded):
+        while appended < len(parents) and parents[appended] < c:
+            if sampleInterval and (triggers[appended], cells[appended]) not in added:
+                added.add((triggers[appended], cells[appended]))
+                visitedSizes[triggers[appended]] += 1
+            appended += 1
+        peakQueue = max(peakQueue, appended - c)
+        if sampleInterval and c % sampleInterval == 0:
+            samples.append(searchSample(c, appended - c, list(visitedSizes)))
+
+    # each neighbor checked is either enqueued or rejected
+    offsets = graph.offsets
+    checked = lastChecked + sum(offsets[cells[c] + 1] - offsets[cells[c]] for c in xrange(expanded - 1))
+    rejectedVisited = checked - (len(cells) - 1) - rejectedTrapOrder
+
+    searchStats(stats, expanded, len(cells), peakQueue, visited, rejectedVisited, rejectedTrapOrder, samples)
+
+
+def raidTombBidirectional(graph, traps, start, end, stats=None):
+    """Find the shortest path between start and end cells using bidirectional
+    breadth-first search, returning the number of moves, the path (or, if no
+    path from start to end is found, the "best effort" path of the forward
+    search) and a set of all visited cells.
+    The forward search works on states (cell, maximum triggered trap) just like
+    raidTomb. The backward search starts at the end and works on states (cell,
+    minimum trap triggered after the cell), so trap indices have to decrease
+    along a reverse path. A forward state (cell, f) and a backward state (cell,
+    b) match if f < b. Both searches always expand the smaller frontier by one
+    full layer and stop after the first layer producing a match, picking the
+    shortest of the matches found. A state is skipped if the same cell has
+    already been reached at a dominating trap level (lower for the forward
+    search, higher for the backward search). The number of moves is the same as
+    returned by raidTomb, the path might differ if there are several shortest
+    paths. The number of states expanded by both searches is stored in stats (if
+    given).
+    """
+    graph = graph.graph
+    noTrap = len(traps.trapDominationOrder) + 1  # larger than any trap index
+
+    # like raidTomb, never consider the empty path a solution
+    if start == end:
+        if stats is not None:
+            stats['expanded'] = 0
+        return -1, [start], set([start])
+
+    # state arrays, indexed by state id, and state ids by cell for both searches
+    fCells, fParents, fLevels, fDists = [start], [-1], [traps.getIndex(start.value)], [0]
+    bCells, bParents, bLevels, bDists = [end], [-1], [noTrap], [0]
+    fReached = {start: [0]}
+    bReached = {end: [0]}
+
+    fFrontier = [0]
+    bFrontier = [0]
+    meetings = []
+    expanded = 0
+    while fFrontier and bFrontier and not meetings:
+
+        # expand a layer of the forward search
+        if len(fFrontier) <= len(bFrontier):
+            nextFrontier = []
+            expanded += len(fFrontier)
+            for s in fFrontier:
+                for neighbor in graph[fCells[s]]:
+
+                    # make sure the neigbor can be visited and update maximum triggered trap
+                    level = fLevels[s]
+                    if traps.isTrap(neighbor.value):
+                        if traps.getIndex(neighbor.value) <= level:  # trap already in path
+                            continue
+                        level = traps.getIndex(neighbor.value)
+
+                    # make sure neighbor has not been visited yet at a lower trap level
+                    reached = fReached.setdefault(neighbor, [])
+                    if any(fLevels[t] <= level for t in reached):
+                        continue
+
+                    # create new state and check if it matches a backward state
+                    n = len(fCells)
+                    fCells.append(neighbor)
+                    fParents.append(s)
+                    fLevels.append(level)
+                    fDists.append(fDists[s] + 1)
+                    reached.append(n)
+                    nextFrontier.append(n)
+                    for t in bReached.get(neighbor, []):
+                        if level < bLevels[t]:
+                            meetings.append((fDists[n] + bDists[t], n, t))
+            fFrontier = nextFrontier
+
+        # expand a layer of the backward search
+        else:
+            nextFrontier = []
+            expanded += len(bFrontier)
+            for s in bFrontier:
+
+                # update minimum triggered trap: the current cell precedes the
+                # rest of the reverse path
+                level = bLevels[s]
+                if traps.isTrap(bCells[s].value):
+                    level = traps.getIndex(bCells[s].value)
+
+                for neighbor in graph.get(bCells[s], []):  # the end might be a wall
+
+                    # make sure the neighbor can precede the rest of the path
+                    if traps.isTrap(neighbor.value) and traps.getIndex(neighbor.value) >= level:
+                        continue
+
+                    # make sure neighbor has not been visited yet at a higher trap level
+                    reached = bReached.setdefault(neighbor, [])
+                    if any(bLevels[t] >= level for t in reached):
+                        continue
+
+                    # create new state and check if it matches a forward state
+                    n = len(bCells)
+                    bCells.append(neighbor)
+                    bParents.append(s)
+                    bLevels.append(level)
+                    bDists.append(bDists[s] + 1)
+                    reached.append(n)
+                    nextFrontier.append(n)
+                    for t in fReached.get(neighbor, []):
+                        if fLevels[t] < level:
+                            meetings.append((fDists[t] + bDists[n], t, n))
+            bFrontier = nextFrontier
+
+    visited = set(fCells) | set(bCells)
+    if stats is not None:
+        stats['expanded'] = expanded
+
+    # join forward path and reversed backward path at the best match
+    if meetings:
+        moves, f, b = min(meetings)
+        backwardPath = rebuildPath(bCells, bParents, b)
+        backwardPath.reverse()
+        return moves, rebuildPath(fCells, fParents, f) + backwardPath[1:], visited
+
+    # return longest/"best effort" path of the forward search
+    return -1, rebuildPath(fCells, fParents, len(fCells) - 1), visited
+
+
+def trapFreeDistances(graph, end):
+    """Compute the number of moves from every non-wall cell to the end while
+    ignoring traps, using breadth-first search starting at the end. Cells
+    missing from the result can't reach the end at all.
+    """
+    graph = graph.graph
+    distances = {end: 0}
+    q = collections.deque([end])
+    while q:
+        c = q.popleft()
+        for neighbor in graph.get(c, []):  # the end might be a wall
+            if neighbor not in distances:
+                distances[neighbor] = distances[c] + 1
+                q.append(neighbor)
+    return distances
+
+
+def raidTombAStar(graph, traps, start, end, heuristic="manhattan", distances=None, stats=None):
+    """Find the shortest path between start and end cells using A* search on
+    states (cell, maximum triggered trap), returning the number of moves, the
+    path (or, if no path from start to end is found, the "best effort" path) and
+    a set of all visited cells.
+    States are expanded in the order of the number of moves so far plus a lower
+    bound of the number of moves left, which is either the manhattan distance to
+    the end or, if heuristic is "bfs", the distance to the end when ignoring
+    traps (see trapFreeDistances, the result of which can be passed as distances
+    to avoid recomputing it). Both are admissible and consistent since traps only
+    ever remove moves, so the number of moves is the same as returned by
+    raidTomb, while the path might differ if there are several shortest paths.
+    The number of expanded states is stored in stats (if given).
+    """
+    if heuristic == "bfs" and distances is None:
+        distances = trapFreeDistances(graph, end)
+    graph = graph.graph
+
+    def lowerBound(cell):
+        """Get the lower bound for the number of moves from a cell to the end,
+        or None if the end can't be reached from the cell.
+        """
+        if heuristic == "bfs":
+            return distances.get(cell)
+        return abs(cell.x - end.x) + abs(cell.y - end.y)
+
+    # like raidTomb, never consider the empty path a solution
+    expanded = 0
+    if start == end or lowerBound(start) is None:
+        if stats is not None:
+            stats['expanded'] = expanded
+        return -1, [start], set([start])
+
+    # state arrays, indexed by state id, and state ids by cell
+    cells, parents, levels, moves = [start], [-1], [traps.getIndex(start.value)], [0]
+    reached = {start: [0]}
+
+    # priority queue of (moves + lower bound, -moves, state id): among states
+    # with equal priority, prefer those closer to the end
+    q = [(lowerBound(start), 0, 0)]
+
+    s = 0
+    found = False
+    while q:
+
+        # get new state and check if the end has been reached
+        f, g, s = heapq.heappop(q)
+        if cells[s] == end:
+            found = True
+            break
+        expanded += 1
+
+        for neighbor in graph[cells[s]]:
+
+            # make sure the neigbor can be visited and update maximum triggered trap
+            level = levels[s]
+            if traps.isTrap(neighbor.value):
+                if traps.getIndex(neighbor.value) <= level:  # trap already in path
+                    continue
+                level = traps.getIndex(neighbor.value)
+
+            # make sure neighbor hasn't been reached yet at a lower trap level
+            # using at most as many moves
+            bound = lowerBound(neighbor)
+            if bound is None:
+                continue
+            n = len(cells)
+            neighborReached = reached.setdefault(neighbor, [])
+            if any(levels[t] <= level and moves[t] <= moves[s] + 1 for t in neighborReached):
+                continue
+
+            # create new state
+            cells.append(neighbor)
+            parents.append(s)
+            levels.append(level)
+            moves.append(moves[s] + 1)
+            neighborReached.append(n)
+            heapq.heappush(q, (moves[n] + bound, -moves[n], n))
+
+    if stats is not None:
+        stats['expanded'] = expanded
+
+    if found:
+        return moves[s], rebuildPath(cells, parents, s), set(cells)
+
+    # return path to the last expanded state as the "best effort" path
+    return -1, rebuildPath(cells, parents, s), set(cells)
+
+
+def raidTombWavefront(graph, traps, start, end, stats=None):
+    """Find the shortest path between start and end cells using breadth-first
+    search on NumPy boolean grids, returning the number of moves, the path (or,
+    if no path from start to end is found, just the start) and a set of all
+    visited cells.
+    The frontier and visited states are stored as one grid per maximum
+    triggered trap level present in the map. Each layer is expanded by shifting
+    the frontier grids right, down, left and up and masking the result with the
+    cells that can be entered at each level: empty cells at the same level, and
+    trap cells at the level of the trap if it dominates the current level. A new
+    state is skipped if the cell has already been reached at the same or a lower
+    level. Once the end has been reached, the path is rebuilt by walking back
+    through the layers using the distance grids. The number of moves is the same
+    as returned by raidTomb, the path might differ if there are several
+    shortest paths. The number of expanded states is stored in stats (if given).
+    Requires NumPy.
+    """
+    if importNumPy() is None:
+        raise ImportError("the wavefront engine requires NumPy")
+    map = graph.map
+
+    # trap index of each cell, or 0 for empty cells
+    grid = numpy.frombuffer(map.getValues(), dtype=numpy.uint8).reshape(map.height, map.width)
+    lookup = numpy.zeros(256, dtype=numpy.int8)
+    for trap, index in traps.trapDominationLookup.items():
+        lookup[ord(trap)] = index
+    indices = lookup[grid]
+    empty = (grid != ord('x')) & (indices == 0)
+
+    # levels that can occur: the start level and higher trap levels present
+    startLevel = traps.getIndex(start.value)
+    levels = [startLevel] + sorted(i for i in numpy.unique(indices) if i > startLevel)
+    entries = dict((level, indices == level) for level in levels)
+
+    # distance grids (-1 for unreached states) and frontier grids per level
+    distances = dict((level, numpy.full((map.height, map.width), -1, dtype=numpy.int32)) for level in levels)
+    frontiers = dict((level, numpy.zeros((map.height, map.width), dtype=bool)) for level in levels)
+    distances[startLevel][start.y, start.x] = 0
+    frontiers[startLevel][start.y, start.x] = True
+
+    expanded = 0
+    moves = 0
+    endLevel = None
+    while endLevel is None and any(frontier.any() for frontier in frontiers.values()):
+        moves += 1
+
+        # cells adjacent to the frontier of each level
+        adjacent = {}
+        for level in levels:
+            frontier = frontiers[level]
+            if not frontier.any():
+                continue
+            expanded += int(frontier.sum())
+            a = numpy.zeros_like(frontier)
+            a[:, 1:] |= frontier[:, :-1]  # right
+            a[1:, :] |= frontier[:-1, :]  # down
+            a[:, :-1] |= frontier[:, 1:]  # left
+            a[:-1, :] |= frontier[1:, :]  # up
+            adjacent[level] = a
+
+        # new states of each level: empty cells at the same level or trap cells
+        # of this level reached from a lower level, unless reached at a lower
+        # or the same level before (including lower levels of this layer)
+        reached = numpy.zeros((map.height, map.width), dtype=bool)
+        for level in levels:
+            new = numpy.zeros((map.height, map.width), dtype=bool)
+            if level in adjacent:
+                new |= adjacent[level] & empty
+            for lower in adjacent:
+                if lower < level:
+                    new |= adjacent[lower] & entries[level]
+            reached |= distances[level] >= 0
+            new &= ~reached
+            reached |= new
+
+            distances[level][new] = moves
+            frontiers[level] = new
+            if endLevel is None and new[end.y, end.x]:
+                endLevel = level
+
+    if stats is not None:
+        stats['expanded'] = expanded
+
+    visited = set()
+    for y, x in zip(*numpy.nonzero(sum(distances[level] >= 0 for level in levels))):
+        visited.add(map.getCell(int(x), int(y)))
+
+    if endLevel is None:
+        return -1, [start], visited
+
+    # walk back through the layers: an empty cell is entered from the same
+    # level, a trap cell from a lower level
+    path = [end]
+    x, y, level = end.x, end.y, endLevel
+    for d in xrange(moves - 1, -1, -1):
+        fromLevels = [level] if indices[y, x] == 0 else [l for l in levels if l < level]
+        for px, py in [(x - 1, y), (x, y - 1), (x + 1, y), (x, y + 1)]:
+            if 0 <= px < map.width and 0 <= py < map.height:
+                matches = [l for l in fromLevels if distances[l][py, px] == d]
+                if matches:
+                    x, y, level = px, py, matches[0]
+                    break
+        path.append(map.getCell(x, y))
+    path.reverse()
+
+    return moves, path, visited
+
+
+def expandStates(graph, traps, visitedLevels, cells, masks, triggers, first=0):
+    """Expand a number of states of raidTombParallel, given by their cell ids,
+    masks and maximum triggered traps, returning a flat list with four entries
+    for each neighbor that hasn't been visited at a trap level on the path to
+    its state: the position of the state in the given lists (plus first), the
+    position of the neighbor in the neighbors array of the graph, the new
+    maximum triggered trap (or -1 if the neighbor is rejected because of the
+    trap domination order) and the new mask.
+    """
+    offsets = graph.offsets
+    neighbors = graph.neighbors
+    values = graph.values
+    lookup = traps.trapDominationLookup
+
+    candidates = []
+    for k in xrange(len(cells)):
+        cell = cells[k]
+        mask = masks[k]
+        for i in xrange(offsets[cell], offsets[cell + 1]):
+            neighbor = neighbors[i]
+            if visitedLevels[neighbor] & mask:
+                continue
+            level = lookup.get(values[neighbor])
+            if level is None:
+                candidates.extend((first + k, i, triggers[k], mask))
+            elif level <= triggers[k]:  # trap already in path
+                candidates.extend((first + k, i, -1, 0))
+            else:
+                candidates.extend((first + k, i, level, mask | 1 << level))
+    return candidates
+
+
+def expandStatesWorker(connection, graph, traps, visitedLevels, frontier, candidates):
+    """Worker process of raidTombParallel: for each (first, last) range of
+    states received, expand the states copied to the frontier arrays (cell ids,
+    masks and maximum triggered traps) using expandStates, write the candidates
+    of state first to candidates starting at 16 * first and send back their
+    number.
+    """
+    frontierCells, frontierMasks, frontierTriggers = frontier
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        first, last = task
+        found = expandStates(graph, traps, visitedLevels, frontierCells[first:last], frontierMasks[first:last], frontierTriggers[first:last], first)
+        candidates[16 * first:16 * first + len(found)] = found
+        connection.send(len(found))
+
+
+def raidTombParallel(graph, traps, start, end, stats=None, workers=None, chunkSize=16384, minChunk=1024):
+    """Find the shortest path between start and end cells exactly like
+    raidTombStateSpace, but expand the states of each breadth-first search layer
+    in parallel using a number of worker processes (by default one per CPU).
+    Each layer is copied to shared memory in chunks of up to chunkSize states,
+    split into one contiguous range of states per worker, and the workers drop
+    the neighbors already visited at a trap level on the path as of the start
+    of the chunk (kept as a bit mask of trap levels per cell in shared memory).
+    Since the visited cells only grow, this never drops a neighbor that
+    raidTombStateSpace would keep. The remaining candidates are then merged in
+    queue order, checking them again against the cells visited since, so the
+    number of moves, the path, the visited cells and the counters stored in
+    stats (if given) are the same as those of raidTombStateSpace. Chunks of
+    fewer than minChunk states are expanded in this process.
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph.map)
+    offsets = graph.offsets
+    neighbors = graph.neighbors
+    size = graph.map.width * graph.map.height
+    startId = graph.map.getId(start.x, start.y)
+    endId = graph.map.getId(end.x, end.y) if end.value != 'x' else -1  # walls can't be reached
+
+    # worker processes can't be started from within pool workers (e.g. in --multi mode)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if multiprocessing.current_process().daemon:
+        workers = 1
+
+    # bit masks of the trap levels each cell has been visited at, and if there
+    # are workers, a copy in shared memory updated along with it
+    visitedLevels = [0] * size
+    sharedVisitedLevels = None
+    processes = []
+    if workers > 1:
+        sharedVisitedLevels = multiprocessing.RawArray('i', size)
+        frontier = [multiprocessing.RawArray('i', chunkSize) for i in xrange(3)]
+        candidates = multiprocessing.RawArray('i', 16 * chunkSize)  # at most four neighbors per state
+        for i in xrange(workers):
+            connection, workerConnection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=expandStatesWorker, args=(workerConnection, graph, traps, sharedVisitedLevels, frontier, candidates))
+            process.daemon = True
+            process.start()
+            processes.append((process, connection))
+
+    try:
+        # add start to state arrays
+        triggered = traps.getIndex(start.value)
+        cells = [startId]
+        parents = [-1]
+        triggers = [triggered]
+        masks = [1 << triggered]
+        visitedLevels[startId] = 1 << triggered
+        if processes:
+            sharedVisitedLevels[startId] = 1 << triggered
+
+        rejectedTrapOrder = 0
+        layerStart = 0
+        while layerStart < len(cells):
+            layerEnd = len(cells)
+            for chunkStart in xrange(layerStart, layerEnd, chunkSize):
+                chunkEnd = min(chunkStart + chunkSize, layerEnd)
+
+                # expand the states of the chunk, in parallel if it's large enough
+                if not processes or chunkEnd - chunkStart < minChunk:
+                    found = expandStates(graph, traps, visitedLevels, cells[chunkStart:chunkEnd], masks[chunkStart:chunkEnd], triggers[chunkStart:chunkEnd])
+                else:
+                    frontier[0][:chunkEnd - chunkStart] = cells[chunkStart:chunkEnd]
+                    frontier[1][:chunkEnd - chunkStart] = masks[chunkStart:chunkEnd]
+                    frontier[2][:chunkEnd - chunkStart] = triggers[chunkStart:chunkEnd]
+                    ranges = []
+                    for i, (process, connection) in enumerate(processes):
+                        first = (chunkEnd - chunkStart) * i / len(processes)
+                        last = (chunkEnd - chunkStart) * (i + 1) / len(processes)
+                        connection.send((first, last))
+                        ranges.append(first)
+                    found = []
+                    for first, (process, connection) in zip(ranges, processes):
+                        found += candidates[16 * first:16 * first + connection.recv()]
+
+                # merge the candidates in queue order
+                for j in xrange(0, len(found), 4):
+                    c = chunkStart + found[j]
+                    neighbor = neighbors[found[j + 1]]
+                    if visitedLevels[neighbor] & masks[c]:
+                        continue
+                    triggered = found[j + 2]
+                    if triggered < 0:
+                        rejectedTrapOrder += 1
+                        continue
+
+                    # create new state
+                    cells.append(neighbor)
+                    parents.append(c)
+                    triggers.append(triggered)
+                    masks.append(found[j + 3])
+
+                    # check if the end has been reached
+                    if neighbor == endId:
+                        visited = visitedSets(traps, cells, triggers, len(cells) - 1)
+                        if stats is not None:
+                            stateSpaceStats(stats, graph, cells, parents, triggers, c + 1, found[j + 1] - offsets[cells[c]] + 1, visited, rejectedTrapOrder)
+                        path = [graph.getCell(id) for id in rebuildPath(cells, parents, len(cells) - 1)]
+                        return len(path) - 1, path, set(graph.getCell(id) for id in set().union(*visited.values()))
+                    else:
+                        visitedLevels[neighbor] |= 1 << triggered
+                        if processes:
+                            sharedVisitedLevels[neighbor] |= 1 << triggered
+            layerStart = layerEnd
+    finally:
+        for process, connection in processes:
+            connection.send(None)
+            process.join()
+
+    # return longest/"best effort" path
+    c = len(cells) - 1
+    visited = visitedSets(traps, cells, triggers, len(cells))
+    if stats is not None:
+        stateSpaceStats(stats, graph, cells, parents, triggers, len(cells), offsets[cells[c] + 1] - offsets[cells[c]], visited, rejectedTrapOrder)
+    path = [graph.getCell(id) for id in rebuildPath(cells, parents, c)]
+    return -1, path, set(graph.getCell(id) for id in set().union(*visited.values()))
+
+
+def visitedSets(traps, cells, triggers, count):
+    """Rebuild the visited sets of raidTombStateSpace (sets of cell ids by trap
+    level) from the first count states of the state arrays, each of which has
+    been added to the visited set of its trap level when it was enqueued.
+    """
+    visited = {}
+    visited[0] = set()
+    for i in traps.trapDominationLookup.values():
+        visited[i] = set()
+    for k in xrange(count):
+        visited[triggers[k]].add(cells[k])
+    return visited
+
+
+class Hierarchy:
+    """Abstraction of a map for hierarchical path finding in the spirit of HPA*:
+    the map is split into clusters of clusterSize x clusterSize cells, and
+    neighboring clusters are connected by portals, pairs of adjacent open cells
+    on either side of their border. Each entrance (maximal run of such pairs
+    along a border) gets one portal in its middle or, if it's at least 6 cells
+    long, one at each end. Since the cells reachable within a cluster depend on
+    the maximum triggered trap, the distances from a portal to the other
+    portals of its cluster are computed for each level on first use and cached,
+    so the hierarchy is meant to be kept for many queries on the same map.
+    """
+
+    map = None
+    graph = None
+    traps = None
+    clusterSize = 0
+    portals = None
+    partners = None
+    edges = None
+    edgesSize = 0
+    clusterSearches = 0
+
+    def __init__(self, map, graph, traps, clusterSize=16):
+        self.map = map
+        self.graph = graph if isinstance(graph, CSRGraph) else CSRGraph(map)
+        self.traps = traps
+        self.clusterSize = clusterSize
+        self.portals = collections.defaultdict(list)  # cluster -> portal ids
+        self.partners = collections.defaultdict(list)  # portal id -> ids of the portals across the border
+        self.edges = {}  # (portal id, level) -> (portal id, level, moves) within the cluster
+
+        width = map.width
+        height = map.height
+        values = self.graph.values
+
+        # vertical borders, then horizontal borders
+        for x in xrange(clusterSize, width, clusterSize):
+            self.addEntrances([(y * width + x - 1, y * width + x) for y in xrange(height)], values)
+        for y in xrange(clusterSize, height, clusterSize):
+            self.addEntrances([((y - 1) * width + x, y * width + x) for x in xrange(width)], values)
+
+    def addEntrances(self, pairs, values):
+        """Add portals for the entrances along a border, given as the pairs of
+        cell ids on either side of it. Entrances don't extend across the
+        corners of clusters.
+        """
+        entrance = []
+        for i, pair in enumerate(pairs):
+            open = values[pair[0]] != 'x' and values[pair[1]] != 'x'
+            if entrance and (not open or i % self.clusterSize == 0):
+                self.addPortals(entrance)
+                entrance = []
+            if open:
+                entrance.append(pair)
+        if entrance:
+            self.addPortals(entrance)
+
+    def addPortals(self, entrance):
+        """Add the portals of an entrance, given as a list of pairs of cell ids
+        on either side of the border.
+        """
+        if len(entrance) >= 6:
+            chosen = [entrance[0], entrance[-1]]
+        else:
+            chosen = [entrance[len(entrance) / 2]]
+        for a, b in chosen:
+            for portal, partner in [(a, b), (b, a)]:
+                if portal not in self.partners:
+                    self.portals[self.getCluster(portal)].append(portal)
+                self.partners[portal].append(partner)
+
+    def getCluster(self, id):
+        """Get the index of the cluster containing the cell with the given id."""
+        width = self.map.width
+        clustersPerRow = (width + self.clusterSize - 1) / self.clusterSize
+        return id / width / self.clusterSize * clustersPerRow + id % width / self.clusterSize
+
+    def searchCluster(self, source, level, targets):
+        """Breadth-first search on states (cell id, maximum triggered trap) from
+        a source cell entered with some level, without leaving its cluster and
+        skipping states dominated by an earlier one of the same cell with a
+        lower or equal level. Returns the parent state of each state reached
+        and, for each of the target cells reached, the levels it has been
+        reached with along with the number of moves, as (level, moves) tuples.
+        """
+        self.clusterSearches += 1
+        width = self.map.width
+        size = self.clusterSize
+        x0 = source % width / size * size
+        y0 = source / width / size * size
+        x1 = x0 + size
+        y1 = y0 + size
+        offsets = self.graph.offsets
+        neighbors = self.graph.neighbors
+        values = self.graph.values
+        lookup = self.traps.trapDominationLookup
+
+        minLevels = {source: level}
+        parents = {(source, level): None}
+        found = {}
+        layer = [(source, level)]
+        moves = 0
+        while layer:
+            moves += 1
+            nextLayer = []
+            for state in layer:
+                id, l = state
+                for i in xrange(offsets[id], offsets[id + 1]):
+                    neighbor = neighbors[i]
+                    if not (x0 <= neighbor % width < x1 and y0 <= neighbor / width < y1):
+                        continue
+                    neighborLevel = l
+                    index = lookup.get(values[neighbor], 0)
+                    if index:
+                        if index <= l:  # trap already in path
+                            continue
+                        neighborLevel = index
+                    if neighbor in minLevels and minLevels[neighbor] <= neighborLevel:
+                        continue
+                    minLevels[neighbor] = neighborLevel
+                    neighborState = (neighbor, neighborLevel)
+                    parents[neighborState] = state
+                    nextLayer.append(neighborState)
+                    if neighbor in targets:
+                        found.setdefault(neighbor, []).append((neighborLevel, moves))
+            layer = nextLayer
+        return parents, found
+
+    def getEdges(self, id, level, end):
+        """Get the states reachable within the cluster of a cell entered with
+        some level, as (cell id, level, moves) tuples: the portals of the
+        cluster and, if it's in the same cluster, the end. The edges between
+        portals are cached.
+        """
+        cluster = self.getCluster(id)
+        edges = []
+        targets = set()
+        if id in self.partners:
+            key = (id, level)
+            if key not in self.edges:
+                parents, found = self.searchCluster(id, level, set(self.portals[cluster]))
+                self.edges[key] = [(target, l, moves) for target in found for l, moves in found[target]]
+                self.edgesSize += sys.getsizeof(self.edges[key]) + len(self.edges[key]) * sys.getsizeof((0, 0, 0))
+            edges += self.edges[key]
+        else:
+            targets.update(self.portals[cluster])
+        if self.getCluster(end) == cluster:
+            targets.add(end)
+        if targets:
+            parents, found = self.searchCluster(id, level, targets)
+            edges += [(target, l, moves) for target in found for l, moves in found[target]]
+        return edges
+
+    def refine(self, source, target):
+        """Get the cells (ids) of the shortest path between two states within a
+        cluster, excluding the source.
+        """
+        parents, found = self.searchCluster(source[0], source[1], set([target[0]]))
+        path = []
+        state = target
+        while state != source:
+            path.append(state[0])
+            state = parents[state]
+        path.reverse()
+        return path
+
+    def query(self, start, end, stats=None):
+        """Find a path between start and end cells using A* search on the
+        abstract graph of states (portal, maximum triggered trap), whose edges
+        are the portals across borders and the cached moves between the portals
+        of a cluster, followed by refining the abstract path within each
+        cluster. Returns the number of moves, the path and a set of the cells of
+        all expanded states. Since paths can only cross borders at portals, the
+        number of moves may be larger than that returned by raidTomb. If no
+        abstract path exists, raidTombStateSpace is used instead, so the answer
+        is never IMPOSSIBLE unless there is no path. If a dictionary is given as
+        stats, the number of expanded states and cluster searches and whether
+        the exact search was needed are stored in it.
+        """
+        width = self.map.width
+        s = start.y * width + start.x
+        e = end.y * width + end.x
+        startLevel = self.traps.getIndex(start.value)
+        clusterSearches = self.clusterSearches
+
+        if s == e:  # like raidTomb, never consider the empty path a solution
+            return -1, [start], set([start])
+
+        def lowerBound(id):
+            """Manhattan distance from a cell to the end."""
+            return abs(id % width - end.x) + abs(id / width - end.y)
+
+        best = {(s, startLevel): 0}
+        parents = {(s, startLevel): None}
+        q = [(lowerBound(s), 0, s, startLevel)]
+        expanded = set()
+        while q:
+            f, moves, id, level = heapq.heappop(q)
+            state = (id, level)
+            if moves > best[state]:
+                continue
+            if id == e:
+                break
+            expanded.add(id)
+
+            # edges within the cluster, then across borders
+            neighbors = [(target, l, moves + m) for target, l, m in self.getEdges(id, level, e)]
+            for partner in self.partners.get(id, []):
+                index = self.traps.getIndex(self.graph.values[partner])
+                if index and index <= level:  # trap already in path
+                    continue
+                neighbors.append((partner, index or level, moves + 1))
+
+            for target, l, m in neighbors:
+                if m < best.get((target, l), m + 1):
+                    best[(target, l)] = m
+                    parents[(target, l)] = state
+                    heapq.heappush(q, (m + lowerBound(target), m, target, l))
+        else:
+            if stats is not None:
+                stats.update({'expanded': len(expanded), 'clusterSearches': self.clusterSearches - clusterSearches, 'fallback': True})
+            return raidTombStateSpace(self.graph, self.traps, start, end)
+
+        # refine the abstract path
+        abstract = []
+        while state is not None:
+            abstract.append(state)
+            state = parents[state]
+        abstract.reverse()
+        path = [s]
+        for source, target in zip(abstract, abstract[1:]):
+            if self.getCluster(source[0]) != self.getCluster(target[0]):
+                path.append(target[0])
+            else:
+                path += self.refine(source, target)
+
+        if stats is not None:
+            stats.update({'expanded': len(expanded), 'clusterSearches': self.clusterSearches - clusterSearches, 'fallback': False})
+        return len(path) - 1, [self.graph.getCell(id) for id in path], set(self.graph.getCell(id) for id in expanded)
+
+    def getFootprint(self):
+        """Estimate the memory used by the portals and cached edges in bytes."""
+        return sys.getsizeof(self.partners) + sys.getsizeof(self.edges) + self.edgesSize
+
+
+def raidTombHierarchical(graph, traps, start, end, stats=None, hierarchy=None):
+    """Find a path between start and end cells using a Hierarchy (see
+    Hierarchy.query), which is built first unless given. Building it is cheap,
+    but its cache of distances between portals only pays off over many queries.
+    """
+    if hierarchy is None:
+        hierarchy = Hierarchy(graph.map, graph, traps)
+    return hierarchy.query(start, end, stats)
+
+
+def distanceField(map, graph, traps, start):
+    """Compute the minimum number of moves from the start to every cell at every
+    maximum triggered trap level by running breadth-first search on states
+    (cell, maximum triggered trap) until all of them have been reached, without
+    stopping at any end. Returns a flat array indexed by level * width * height
+    + y * width + x (with levels ranging from 0 for no triggered trap to the
+    number of traps), containing -1 for unreachable states, and the same
+    collapsed to the minimum over all levels, indexed by y * width + x.
+    """
+    graph = graph.graph
+    size = map.width * map.height
+
+    levels = array.array('i', [-1]) * ((len(traps.trapDominationOrder) + 1) * size)
+    level = traps.getIndex(start.value)
+    levels[level * size + start.y * map.width + start.x] = 0
+
+    q = collections.deque([(start, level)])
+    while q:
+        cell, level = q.popleft()
+        moves = levels[level * size + cell.y * map.width + cell.x] + 1
+        for neighbor in graph[cell]:
+
+            # make sure the neigbor can be visited and update maximum triggered trap
+            neighborLevel = level
+            if traps.isTrap(neighbor.value):
+                if traps.getIndex(neighbor.value) <= level:  # trap already in path
+                    continue
+                neighborLevel = traps.getIndex(neighbor.value)
+
+            i = neighborLevel * size + neighbor.y * map.width + neighbor.x
+            if levels[i] < 0:
+                levels[i] = moves
+                q.append((neighbor, neighborLevel))
+
+    # collapse to the best value per cell
+    best = array.array('i', [-1]) * size
+    for i in xrange(len(levels)):
+        if levels[i] >= 0 and (best[i % size] < 0 or levels[i] < best[i % size]):
+            best[i % size] = levels[i]
+
+    return levels, best
+
+
+def writeGrid(filename, values, shape):
+    """Write a flat array of 32-bit integers as a dense array of the given shape
+    (e.g. (height, width)), either in NumPy's .npy format if the filename ends
+    with .npy (so it can be loaded using numpy.load without NumPy being required
+    here) or as plain little-endian binary data otherwise.
+    """
+    values = array.array('i', values)
+    if sys.byteorder != "little":
+        values.byteswap()
+
+    with open(filename, "wb") as f:
+        if filename.endswith(".npy"):
+            header = "{'descr': '<i4', 'fortran_order': False, 'shape': (" + ", ".join(str(i) for i in shape) + ("," if len(shape) == 1 else "") + "), }"
+            header += " " * (63 - (10 + len(header)) % 64) + "\n"  # align data to 64 bytes
+            f.write("\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header)
+        values.tofile(f)
+
+
+# search engines selectable using the --engine option
+ENGINES = {
+    'reference': raidTomb,
+    'statespace': raidTombStateSpace,
+    'bidirectional': raidTombBidirectional,
+    'astar': raidTombAStar,
+    'astar-bfs': functools.partial(raidTombAStar, heuristic="bfs"),
+    'wavefront': raidTombWavefront,
+    'parallel': raidTombParallel,
+}
+
+# engines finding valid, but not necessarily shortest paths, only selectable
+# for sessions (--queries and --serve), which keep their per-map precomputations
+# across queries, and whose answers are labeled as approximate
+APPROXIMATE_ENGINES = {
+    'hierarchical': raidTombHierarchical,
+}
+
+
+def labelComponents(values, width, height, blocked):
+    """Label the connected components of the cells of a map (given by their
+    values, indexed by cell id) whose values aren't blocked, returning an array
+    of labels indexed by cell id, -1 for blocked cells. For large maps, if NumPy
+    is available, this is a union-find over the runs of unblocked cells in each
+    row, merging runs that overlap vertically in a few vectorized rounds.
+    """
+    size = width * height
+    if size >= NUMPY_MIN_CELLS and importNumPy() is not None:
+        table = numpy.zeros(256, dtype=bool)
+        for value in blocked:
+            table[ord(value)] = True
+        open = ~table[numpy.frombuffer(values, dtype=numpy.uint8)]
+        grid = open.reshape(height, width)
+
+        # each run of unblocked cells in a row starts out as its own component
+        starts = grid.copy()
+        starts[:, 1:] &= ~grid[:, :-1]
+        runs = numpy.cumsum(starts.ravel()) - 1
+        runCount = int(starts.sum())
+        if runCount == 0:
+            return array.array('i', [-1]) * size
+
+        # hook the root of the larger of two vertically adjacent runs onto the
+        # root of the smaller one, then compress the trees by pointer jumping
+        vertical = (grid[:-1] & grid[1:]).ravel()
+        a = runs[:-width][vertical]
+        b = runs[width:][vertical]
+        parent = numpy.arange(runCount)
+        while True:
+            rootA = parent[a]
+            rootB = parent[b]
+            merge = rootA != rootB
+            if not merge.any():
+                break
+            numpy.minimum.at(parent, numpy.maximum(rootA, rootB)[merge], numpy.minimum(rootA, rootB)[merge])
+            while True:
+                grandparent = parent[parent]
+                if (grandparent == parent).all():
+                    break
+                parent = grandparent
+
+        labels = numpy.where(open, parent[runs], -1).astype(numpy.int32)
+        return array.array('i', labels.tostring())
+
+    # otherwise, a depth-first search from each unlabeled cell
+    blocked = set(blocked)
+    labels = array.array('i', [-1]) * size
+    label = 0
+    for i in xrange(size):
+        if labels[i] >= 0 or values[i] in blocked:
+            continue
+        labels[i] = label
+        stack = [i]
+        while stack:
+            c = stack.pop()
+            x = c % width
+            for neighbor, exists in [(c + 1, x < width - 1), (c + width, c + width < size), (c - 1, x > 0), (c - width, c >= width)]:
+                if exists and labels[neighbor] < 0 and values[neighbor] not in blocked:
+                    labels[neighbor] = label
+                    stack.append(neighbor)
+        label += 1
+    return labels
+
+
+class ConnectivityIndex:
+    """Connected components of the cells of a map, used for proving that there
+    is no path from start to end without searching. The maximum triggered trap
+    never decreases along a path, so a path starting on a trap (or, with level
+    0, on an empty cell) can only ever enter traps dominating it: for each
+    level, traps of that level or lower block like walls. The components for a
+    level are computed on first use, level 0 being plain connectivity of all
+    non-wall cells.
+    """
+
+    map = None
+    traps = None
+    values = None
+    labels = None
+
+    def __init__(self, map, traps):
+        self.map = map
+        self.traps = traps
+        self.values = map.getValues()
+        self.labels = {}
+
+    def getLabels(self, level):
+        """Get the component label of each cell (see labelComponents) for paths
+        starting on a cell of the given level.
+        """
+        labels = self.labels.get(level)
+        if labels is None:
+            blocked = ['x'] + self.traps.trapDominationOrder[:level]
+            labels = self.labels[level] = labelComponents(self.values, self.map.width, self.map.height, blocked)
+        return labels
+
+    def query(self, start, end):
+        """Check whether there might be a path from the start to the end cell,
+        returning False if there provably isn't and True otherwise, as well as
+        a lower bound for its number of moves (the Manhattan distance, or -1 if
+        there's no path).
+        """
+
+        # like raidTomb, never consider a path returning to the start
+        if start == end or start.value == 'x':
+            return False, -1
+
+        width = self.map.width
+        labels = self.getLabels(self.traps.getIndex(start.value))
+        target = labels[end.y * width + end.x]
+
+        # the start itself may be blocked, but its neighbors must not be
+        components = set([labels[start.y * width + start.x]])
+        for x, y in [(start.x + 1, start.y), (start.x, start.y + 1), (start.x - 1, start.y), (start.x, start.y - 1)]:
+            if 0 <= x < width and 0 <= y < self.map.height:
+                components.add(labels[y * width + x])
+
+        if target < 0 or target not in components:
+            return False, -1
+        return True, abs(end.x - start.x) + abs(end.y - start.y)
+
+    def getFootprint(self):
+        """Get the memory used by the labels computed so far in bytes."""
+        return sum(len(labels) * labels.itemsize for labels in self.labels.itervalues())
+
+
+class LRUCache:
+    """Dictionary-like cache holding entries of a total size of at most maxsize,
+    discarding the least recently used entries when full. Unless given, the size
+    of an entry is 1, so maxsize is the maximum number of entries.
+    """
+
+    entries = None
+    sizes = None
+    size = 0
+    maxsize = 0
+
+    def __init__(self, maxsize):
+        self.entries = collections.OrderedDict()
+        self.sizes = {}
+        self.maxsize = maxsize
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """Get the value stored for a key (marking it as recently used), or
+        default if the key is not in the cache.
+        """
+        if key not in self.entries:
+            return default
+        value = self.entries.pop(key)
+        self.entries[key] = value
+        return value
+
+    def put(self, key, value, size=1):
+        """Store a value, discarding the least recently used entries until it
+        fits. Storing a key again updates its size. An entry larger than maxsize
+        is still stored, but discards all others. Returns the discarded values,
+        including a value replaced for the same key.
+        """
+        discarded = []
+        if key in self.entries:
+            discarded.append(self.entries.pop(key))
+            self.size -= self.sizes.pop(key)
+        while self.entries and self.size + size > self.maxsize:
+            oldKey, oldValue = self.entries.popitem(last=False)
+            discarded.append(oldValue)
+            self.size -= self.sizes.pop(oldKey)
+        self.entries[key] = value
+        self.sizes[key] = size
+        self.size += size
+        return discarded
+
+
+class Session:
+    """Map loaded once for answering many queries: the parsed map and graph as
+    well as per-map precomputations are reused across queries, and answers are
+    cached by start and end coordinates.
+    """
+
+    traps = None
+    map = None
+    graph = None
+    engine = None
+    answers = None
+    distances = None
+    index = None
+    hierarchy = None
+    approximate = False
+    footprint = 0
+
+    def __init__(self, traps, map, graph, engine="statespace", cacheSize=1024):
+        self.traps = traps
+        self.map = map
+        self.graph = graph
+        self.engine = engine
+        self.answers = LRUCache(cacheSize)
+        self.distances = LRUCache(max(1, cacheSize / 64))  # one full map each
+        self.index = ConnectivityIndex(map, traps)
+        if engine == "hierarchical":
+            self.hierarchy = Hierarchy(map, graph, traps)
+        self.approximate = engine in APPROXIMATE_ENGINES
+
+        # the map and the arrays of the graph don't change, so they're counted
+        # once; cached answers and distances are counted as they come and go
+        size = map.width * map.height
+        self.footprint = size * (8 + sys.getsizeof(Cell(0, 0, 'o')))
+        if isinstance(map, BufferMap):
+            self.footprint += map.height * map.stride
+        else:
+            self.footprint += sum(sys.getsizeof(row) for row in map.map)
+        if isinstance(graph, CSRGraph):
+            self.footprint += sys.getsizeof(graph.values)
+            self.footprint += (len(graph.offsets) + len(graph.neighbors)) * graph.offsets.itemsize
+
+    def getCell(self, x, y):
+        """Get the cell at position x, y."""
+        return self.map.getCell(x, y)
+
+    def query(self, start, end):
+        """Find the shortest path between the start and end coordinates, given
+        as (x, y) tuples, returning the number of moves (or -1 if no path
+        exists) and the path.
+        """
+        key = (start, end)
+        answer = self.answers.get(key)
+        if answer is None:
+            startCell = self.getCell(*start)
+            endCell = self.getCell(*end)
+
+            # queries between disconnected cells are answered by the index, and
+            # the trap-free distances to an end are shared by all queries for it
+            possible, lowerBound = self.index.query(startCell, endCell)
+            if not possible:
+                moves = -1
+            elif self.engine == "astar-bfs":
+                distances = self.distances.get(end)
+                if distances is None:
+                    distances = trapFreeDistances(self.graph, endCell)
+                    self.footprint += sys.getsizeof(distances)
+                    for old in self.distances.put(end, distances):
+                        self.footprint -= sys.getsizeof(old)
+                moves, path, visited = raidTombAStar(self.graph, self.traps, startCell, endCell, heuristic="bfs", distances=distances)
+            elif self.engine == "hierarchical":
+                moves, path, visited = self.hierarchy.query(startCell, endCell)
+            else:
+                moves, path, visited = ENGINES[self.engine](self.graph, self.traps, startCell, endCell)
+
+            if moves < 0:
+                path = []
+            answer = (moves, path)
+            self.footprint += sys.getsizeof(path)
+            for oldMoves, oldPath in self.answers.put(key, answer):
+                self.footprint -= sys.getsizeof(oldPath)
+        return answer
+
+    def getFootprint(self):
+        """Estimate the memory used by the map, graph, cached answers and
+        precomputations of the session in bytes, assuming every field has been
+        turned into a cell (which is an upper bound, but avoids scanning them).
+        This takes constant time: the sizes of the cached answers, distances and
+        hierarchy edges are kept up to date as they change.
+        """
+        footprint = self.footprint
+        graph = self.graph
+        if isinstance(graph, CSRGraph):
+            adjacencyList = graph.adjacencyList
+        else:
+            adjacencyList = graph.graph
+        if adjacencyList is not None:  # one list of up to four neighbors per cell
+            footprint += sys.getsizeof(adjacencyList) + len(adjacencyList) * sys.getsizeof([None] * 4)
+
+        if self.hierarchy is not None:
+            footprint += self.hierarchy.getFootprint()
+        return footprint + self.index.getFootprint()
+
+
+def raidTombs(session, queries, verbose=False):
+    """Answer a list of queries ((startX, startY), (endX, endY)) on a session,
+    printing the number of moves (or IMPOSSIBLE) for each of them and the
+    throughput to stderr. If the engine of the session is approximate, this is
+    noted on stderr first.
+    """
+    if session.approximate:
+        sys.stderr.write("Answers are approximate: the " + session.engine + " engine finds valid, but not necessarily shortest paths\n")
+
+    t = time.time()
+    for start, end in queries:
+        moves, path = session.query(start, end)
+        if verbose:
+            print "Map:"
+            session.map.prettyprint(session.getCell(*start), session.getCell(*end), path)
+            if session.approximate:
+                print "Approximate number of moves (possibly not minimal) to reach the end position from the start position:"
+            else:
+                print "Minimum number of moves to reach the end position from the start position:"
+        if moves >= 0:
+            print moves
+        else:
+            print "IMPOSSIBLE"
+    t = time.time() - t
+
+    sys.stderr.write("Answered " + str(len(queries)) + " queries in " + "%.3f" % t + " s (" + "%.1f" % (len(queries) / max(t, 1e-9)) + " queries per second)\n")
+
+
+# result cache entries: header (see RESULT_HEADER), followed by the path as the
+# differences between consecutive cell ids and optionally the visited cells as
+# one byte per cell (1 if visited), both compressed using zlib
+RESULT_MAGIC = "BTRES\x01"
+RESULT_HEADER = struct.Struct("<6sBiIII")  # magic, whether the visited cells are stored, moves, path length, compressed path and visited cells sizes
+
+# part of the key of cached results, to be incremented whenever the engines
+# change their answers
+SOLVER_VERSION = 1
+
+
+def resultKey(traps, map, start, end, engine):
+    """Compute the key of a result in a ResultCache: the SHA-1 hash of the
+    solver version, engine, trap domination order, map, start and end.
+    """
+    h = hashlib.sha1()
+    h.update(" ".join(str(i) for i in [SOLVER_VERSION, engine, "".join(traps.trapDominationOrder), map.width, map.height, start.x, start.y, end.x, end.y]) + "\n")
+    h.update(map.getValues())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Results (number of moves, path and optionally visited cells) stored in a
+    directory, one file per result named after its key (see resultKey), which
+    can be shared by several processes. The total size of the results is kept
+    in a file next to them, and once it exceeds maxSize bytes, the least
+    recently used results are deleted until they take up at most three
+    quarters of maxSize, so the directory is only scanned every now and then.
+    Concurrent writers may lose updates of the total size, which the next scan
+    corrects.
+    """
+
+    directory = None
+    maxSize = 0
+
+    def __init__(self, directory, maxSize=64 * 1024 * 1024):
+        self.directory = directory
+        self.maxSize = maxSize
+
+    def getSizeFilename(self):
+        """Get the name of the file storing the total size of the results."""
+        return os.path.join(self.directory, "size")
+
+    def getFilename(self, key):
+        """Get the name of the file storing the result with the given key."""
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key, map, visited=False):
+        """Get the number of moves, path and visited cells (an empty set if they
+        haven't been stored) of the result with the given key on a map, marking
+        it as recently used, or None if it isn't cached or visited is true but
+        its visited cells haven't been stored.
+        """
+        filename = self.getFilename(key)
+        try:
+            with open(filename, "rb") as f:
+                data = f.read()
+            os.utime(filename, None)
+        except (IOError, OSError):
+            return None
+
+        # truncated or otherwise damaged results count as not cached
+        try:
+            magic, hasVisited, moves, pathLength, pathSize, visitedSize = RESULT_HEADER.unpack_from(data)
+            if magic != RESULT_MAGIC or (visited and not hasVisited):
+                return None
+            offset = RESULT_HEADER.size
+            differences = array.array('i', zlib.decompress(data[offset:offset + pathSize]))
+            if hasVisited:
+                flags = zlib.decompress(data[offset + pathSize:offset + pathSize + visitedSize])
+        except (struct.error, zlib.error, ValueError):
+            return None
+
+        path = []
+        id = 0
+        for difference in differences:
+            id += difference
+            path.append(map.getCell(id % map.width, id / map.width))
+
+        visitedCells = set()
+        if hasVisited:
+            id = flags.find("\x01")
+            while id >= 0:
+                visitedCells.add(map.getCell(id % map.width, id / map.width))
+                id = flags.find("\x01", id + 1)
+
+        return moves, path, visitedCells
+
+    def put(self, key, map, moves, path, visited=None):
+        """Store the number of moves, path and, unless None, visited cells of a
+        result on a map under the given key, then delete the least recently used
+        results if the cache is full.
+        """
+        ids = [c.y * map.width + c.x for c in path]
+        pathData = zlib.compress(array.array('i', [b - a for a, b in zip([0] + ids, ids)]).tostring())
+        visitedData = ""
+        if visited is not None:
+            flags = bytearray(map.width * map.height)
+            for c in visited:
+                flags[c.y * map.width + c.x] = 1
+            visitedData = zlib.compress(str(flags))
+        data = RESULT_HEADER.pack(RESULT_MAGIC, visited is not None, moves, len(path), len(pathData), len(visitedData)) + pathData + visitedData
+
+        # write to a temporary file first, so other processes never read a
+        # partially written result
+        filename = self.getFilename(key)
+        try:
+            os.makedirs(os.path.dirname(filename))
+        except OSError:  # already exists
+            pass
+        try:
+            replaced = os.path.getsize(filename)
+        except OSError:
+            replaced = 0
+        temporary = filename + "." + str(os.getpid())
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.rename(temporary, filename)
+
+        # update the total size, only scanning the directory if it's unknown
+        # or the cache is full
+        size = self.readSize()
+        if size is None:
+            self.evict()
+        elif size + len(data) - replaced > self.maxSize:
+            self.evict(self.maxSize * 3 / 4)
+        else:
+            self.writeSize(size + len(data) - replaced)
+
+    def readSize(self):
+        """Read the total size of the results, or None if it isn't known."""
+        try:
+            with open(self.getSizeFilename()) as f:
+                return int(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+
+    def writeSize(self, size):
+        """Write the total size of the results."""
+        temporary = self.getSizeFilename() + "." + str(os.getpid())
+        with open(temporary, "w") as f:
+            f.write(str(size))
+        os.rename(temporary, self.getSizeFilename())
+
+    def evict(self, targetSize=None):
+        """Delete the least recently used results until the remaining ones take
+        up at most targetSize (by default maxSize) bytes and store their total
+        size. This scans the whole cache directory.
+        """
+        if targetSize is None:
+            targetSize = self.maxSize
+        results = []
+        size = 0
+        for directory, subdirectories, filenames in os.walk(self.directory):
+            if directory == self.directory:  # the size file
+                continue
+            for filename in filenames:
+                filename = os.path.join(directory, filename)
+                try:
+                    s = os.stat(filename)
+                except OSError:  # deleted by another process
+                    continue
+                results.append((s.st_mtime, filename, s.st_size))
+                size += s.st_size
+
+        results.sort()
+        for mtime, filename, filesize in results:
+            if size <= targetSize:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            size -= filesize
+        self.writeSize(size)
+
+
+def raidTombCached(cache, traps, map, start, end, engine="statespace", visited=False):
+    """Answer a query from a ResultCache if possible, or else compute the graph
+    and find the shortest path using an engine, storing the result (with the
+    visited cells if visited is true) in the cache. Returns the number of moves,
+    path and visited cells like the engines, but the visited cells are only
+    returned if visited is true.
+    """
+    key = resultKey(traps, map, start, end, engine)
+    result = cache.get(key, map, visited)
+    if result is None:
+        graph = CSRGraph(map)
+        moves, path, visitedCells = ENGINES[engine](graph, traps, start, end)
+        if not visited:
+            visitedCells = None
+        cache.put(key, map, moves, path, visitedCells)
+        result = moves, path, visitedCells or set()
+    return result
+
+
+class Replanner:
+    """Shortest path between fixed start and end cells on a map whose cells
+    change over time, e.g. when walls are opened or traps are added or removed.
+    Breadth-first search runs on states (cell, maximum triggered trap), skipping
+    states whose cell has already been reached at the same or a lower trap
+    level, and stops after the layer (i.e. the states reached after some number
+    of moves) in which the end is reached. The number of moves to each state is
+    kept along with the layers. An edit can't change any layer before the first
+    one in which an edited cell is reached, either before or after the edit
+    (through one of its neighbors), so only the layers from there on are
+    discarded and the search is resumed from the last layer kept. The number of
+    moves is the same as returned by raidTomb.
+    """
+
+    traps = None
+    map = None
+    start = None
+    end = None
+    values = None
+    trapLevels = None
+    adjacency = None
+    levels = None
+    minLevels = None
+    layers = None
+
+    def __init__(self, traps, map, start, end):
+        self.traps = traps
+        self.map = map
+        self.size = map.width * map.height
+        self.noTrap = len(traps.trapDominationOrder) + 1  # larger than any trap index
+        self.startId = map.getId(start.x, start.y)
+        self.endId = map.getId(end.x, end.y)
+
+        # cell values, trap indices (0 for any other cell) and non-wall
+        # neighbors, which are updated on every edit
+        self.values = list(map.getValues())
+        self.trapLevels = array.array('i', [traps.getIndex(value) for value in self.values])
+        self.adjacency = [self.getNeighbors(id) for id in xrange(self.size)]
+
+        # moves to each state level * width * height + y * width + x (or -1),
+        # and the minimum trap level at which each cell has been reached
+        self.levels = array.array('i', [-1]) * (self.noTrap * self.size)
+        self.minLevels = array.array('i', [self.noTrap]) * self.size
+        self.layers = []
+        self.recompute()
+
+    def getAdjacent(self, id):
+        """Get the ids of the (up to four) cells adjacent to a cell in the same
+        order as Map.getAdjacent, including walls.
+        """
+        width = self.map.width
+        x = id % width
+        adj = []
+        if x < width - 1:
+            adj.append(id + 1)
+        if id + width < self.size:
+            adj.append(id + width)
+        if x > 0:
+            adj.append(id - 1)
+        if id >= width:
+            adj.append(id - width)
+        return adj
+
+    def getNeighbors(self, id):
+        """Get the ids of the non-wall cells adjacent to a cell, or none if the
+        cell itself is a wall (which only the start can be), like CSRGraph.
+        """
+        if self.values[id] == 'x':
+            return []
+        return [neighbor for neighbor in self.getAdjacent(id) if self.values[neighbor] != 'x']
+
+    def isEndReached(self):
+        """Check whether the end has been reached at any trap level."""
+        return self.minLevels[self.endId] < self.noTrap
+
+    def search(self):
+        """Continue breadth-first search from the last layer, adding layers
+        until the end or no new states are reached. Returns the number of states
+        expanded.
+        """
+        size = self.size
+        levels = self.levels
+        minLevels = self.minLevels
+        trapLevels = self.trapLevels
+        adjacency = self.adjacency
+
+        expanded = 0
+        layer = self.layers[-1]
+        while layer and not self.isEndReached():
+            moves = len(self.layers)
+            nextLayer = []
+            for state in layer:
+                expanded += 1
+                level, id = divmod(state, size)
+                for neighbor in adjacency[id]:
+
+                    # make sure the neigbor can be visited and update maximum triggered trap
+                    neighborLevel = level
+                    trapLevel = trapLevels[neighbor]
+                    if trapLevel:
+                        if trapLevel <= level:  # trap already in path
+                            continue
+                        neighborLevel = trapLevel
+
+                    # skip the neighbor if it has been reached at the same or a lower level
+                    if neighborLevel < minLevels[neighbor]:
+                        minLevels[neighbor] = neighborLevel
+                        neighborState = neighborLevel * size + neighbor
+                        levels[neighborState] = moves
+                        nextLayer.append(neighborState)
+
+            if nextLayer:
+                self.layers.append(nextLayer)
+            layer = nextLayer
+        return expanded
+
+    def discard(self, first):
+        """Discard the layers from the given one on."""
+        cells = set()
+        for layer in self.layers[first:]:
+            for state in layer:
+                self.levels[state] = -1
+                cells.add(state % self.size)
+        del self.layers[first:]
+
+        # restore the minimum trap levels from the states kept
+        for id in cells:
+            self.minLevels[id] = self.noTrap
+            for level in xrange(self.noTrap):
+                if self.levels[level * self.size + id] >= 0:
+                    self.minLevels[id] = level
+                    break
+
+    def recompute(self):
+        """Discard all layers and search from the start. Returns the number of
+        states expanded.
+        """
+        self.discard(0)
+        level = self.trapLevels[self.startId]
+        self.levels[level * self.size + self.startId] = 0
+        self.minLevels[self.startId] = level
+        self.layers = [[level * self.size + self.startId]]
+        return self.search()
+
+    def getExpanded(self):
+        """Get the number of states a full recompute expands, i.e. the states
+        of all layers but the one in which the end has been reached.
+        """
+        layers = self.layers[:-1] if self.isEndReached() else self.layers
+        return sum(len(layer) for layer in layers)
+
+    def editCells(self, edits):
+        """Apply a list of edits (x, y, value) to the map and update the
+        minimum numbers of moves. Returns a report of the work done: the number
+        of states expanded, the number of states a full recompute would have
+        expanded, the number of states kept and the share of work saved compared
+        to a full recompute.
+        """
+        width = self.map.width
+        ids = []
+        for x, y, value in edits:
+            if value not in ['o', 'x'] and not self.traps.isTrap(value):
+                raise ValueError("invalid cell value: " + value)
+            ids.append(y * width + x)
+
+        # find the first layer in which an edited cell is reached before the
+        # edit...
+        first = len(self.layers) + 1  # no layer affected
+        for id in ids:
+            if id == self.startId:
+                first = 0
+            for state in xrange(id, len(self.levels), self.size):
+                if self.levels[state] >= 0:
+                    first = min(first, self.levels[state])
+
+        # ...or would be reached after it, through one of its neighbors
+        for id in ids:
+            for neighbor in self.getAdjacent(id):
+                for state in xrange(neighbor, len(self.levels), self.size):
+                    if self.levels[state] >= 0:
+                        first = min(first, self.levels[state] + 1)
+
+        # apply the edits and update the neighbors of the edited cells
+        for (x, y, value), id in zip(edits, ids):
+            self.values[id] = value
+            self.trapLevels[id] = self.traps.getIndex(value)
+            self.map.setAt(x, y, value)
+        for id in ids:
+            for neighbor in [id] + self.getAdjacent(id):
+                self.adjacency[neighbor] = self.getNeighbors(neighbor)
+
+        # discard the affected layers and resume from the last one kept
+        if first == 0:
+            expanded = self.recompute()
+        elif first < len(self.layers) or (first == len(self.layers) and not self.isEndReached()):
+            self.discard(first)
+            expanded = self.search()
+        else:
+            expanded = 0
+
+        full = self.getExpanded()
+        return {
+            'expanded': expanded,
+            'fullExpanded': full,
+            'kept': sum(len(layer) for layer in self.layers[:first]),
+            'saved': 1 - float(expanded) / max(full, 1),
+        }
+
+    def query(self):
+        """Get the minimum number of moves from the start to the end (or -1 if
+        the end can't be reached) and a shortest path, rebuilt by stepping back
+        to any state reached one move earlier.
+        """
+        if not self.isEndReached():
+            return -1, []
+        state = self.minLevels[self.endId] * self.size + self.endId
+        moves = self.levels[state]
+        if moves == 0:  # like raidTomb, never consider the empty path a solution
+            return -1, []
+
+        # entering a trap cell raises the level to its trap, any other cell
+        # keeps the level
+        path = [state]
+        while self.levels[state] > 0:
+            level, id = divmod(state, self.size)
+            if self.trapLevels[id]:
+                neighborLevels = xrange(level)
+            else:
+                neighborLevels = [level]
+            state = next(neighborLevel * self.size + neighbor
+                         for neighbor in self.getAdjacent(id)
+                         for neighborLevel in neighborLevels
+                         if self.levels[neighborLevel * self.size + neighbor] == self.levels[state] - 1)
+            path.append(state)
+        path.reverse()
+
+        width = self.map.width
+        return moves, [self.map.getCell(state % width, state % self.size / width) for state in path]
+
+
+def solveInstance(instance, engine="statespace", cache=None, index=True):
+    """Parse an instance given as a list of lines and find the number of moves
+    of the shortest path from start to end (or -1 if there is none), using a
+    ResultCache if given. Unless index is false, the connectivity index is
+    consulted first.
+    """
+    traps, map, graph, start, end = parseInput(instance, buildGraph=cache is None)
+    if index and not ConnectivityIndex(map, traps).query(start, end)[0]:
+        return -1
+    if cache is not None:
+        moves, path, visited = raidTombCached(cache, traps, map, start, end, engine)
+    else:
+        moves, path, visited = ENGINES[engine](graph, traps, start, end)
+    return moves
+
+
+def solveInstanceWithEngine(arguments):
+    """Unpack the arguments of solveInstance, for use with multiprocessing."""
+    return solveInstance(*arguments)
+
+
+def raidTombsInParallel(instances, engine="statespace", workers=None, cache=None, index=True):
+    """Solve a stream of instances in parallel using a pool of worker processes
+    (or in this process if workers is 1) like solveInstance, yielding the
+    number of moves for each instance in input order. At most a few
+    instances per worker are read ahead, so memory usage doesn't depend on the
+    number of instances.
+    """
+    if workers == 1:
+        for instance in instances:
+            yield solveInstance(instance, engine, cache, index)
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        pending = collections.deque()
+        maxPending = 4 * (workers or multiprocessing.cpu_count())
+        for instance in instances:
+            pending.append(pool.apply_async(solveInstanceWithEngine, [(instance, engine, cache, index)]))
+
+            # wait for the oldest instance before reading further
+            if len(pending) >= maxPending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+
+
+def parseAddress(address):
+    """Parse the address of a server, either HOST:PORT for TCP or the path of
+    a Unix socket, returning the socket family and address.
+    """
+    if ":" in address:
+        host, port = address.rsplit(":", 1)
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+class SessionStore:
+    """Sessions for the maps uploaded to a server, identified by handles (the
+    SHA-1 hash of the map) and discarded least recently used first once their
+    estimated memory footprint exceeds maxFootprint bytes. Requests and
+    responses are dictionaries (see respond), and only one request is handled
+    at a time.
+    """
+
+    sessions = None
+    engine = None
+    cacheSize = 0
+    lock = None
+
+    def __init__(self, engine="statespace", maxFootprint=256 * 1024 * 1024, cacheSize=1024):
+        self.sessions = LRUCache(maxFootprint)
+        self.engine = engine
+        self.cacheSize = cacheSize
+        self.lock = threading.Lock()
+
+    def upload(self, lines):
+        """Parse a map given as lines like in the input format (any lines after
+        the map are ignored) unless it's already loaded, and return its handle.
+        """
+        mapWidth, mapHeight = [int(i) for i in lines[1].split(" ")]
+        lines = [str(line).strip() for line in lines[:mapHeight+2]]
+        if len(lines) != mapHeight + 2 or any(len(row) != mapWidth for row in lines[2:]):
+            raise ValueError("map doesn't match its width and height")
+        handle = hashlib.sha1("\n".join(lines)).hexdigest()
+
+        session = self.sessions.get(handle)
+        if session is None:
+            traps, map, graph = parseMap(lines)
+            session = Session(traps, map, graph, self.engine, self.cacheSize)
+            self.sessions.put(handle, session, session.getFootprint())
+        return handle
+
+    def query(self, handle, start, end):
+        """Find the shortest path between the start and end coordinates, given
+        as (x, y) tuples, on the map with the given handle, returning the number
+        of moves (or -1 if no path exists) and the path as a list of (x, y)
+        tuples, or None if the map isn't loaded (anymore).
+        """
+        session = self.sessions.get(handle)
+        if session is None:
+            return None
+
+        for x, y in [start, end]:
+            if not (0 <= x < session.map.width and 0 <= y < session.map.height):
+                raise ValueError("coordinates out of bounds: " + str(x) + " " + str(y))
+        cached = (start, end) in session.answers
+        moves, path = session.query(start, end)
+
+        # cached answers and precomputations make the session grow (or shrink,
+        # when older answers are discarded), but answering from the cache doesn't
+        if not cached:
+            self.sessions.put(handle, session, session.getFootprint())
+        return moves, [(c.x, c.y) for c in path]
+
+    def respond(self, request):
+        """Respond to a request, which is one of the following (with responses):
+
+        {"op": "upload", "map": [LINES]}    -> {"handle": HANDLE}
+        {"op": "query", "handle": HANDLE, "start": [X, Y], "end": [X, Y]}
+                                            -> {"moves": MOVES, "path": [[X, Y], ...], "approximate": BOOL}
+        {"op": "stats"}                     -> {"maps": COUNT, "footprint": BYTES, "maxFootprint": BYTES}
+
+        The number of moves is -1 if there is no path, and approximate is true
+        if the engine may not find the shortest path. Malformed requests and
+        queries for unknown handles (e.g. discarded maps, which need to be
+        uploaded again) are answered with {"error": MESSAGE}.
+        """
+        with self.lock:
+            try:
+                op = request['op']
+                if op == "upload":
+                    return {'handle': self.upload(request['map'])}
+                if op == "query":
+                    answer = self.query(request['handle'], tuple(request['start']), tuple(request['end']))
+                    if answer is None:
+                        return {'error': "unknown handle"}
+                    moves, path = answer
+                    return {'moves': moves, 'path': path, 'approximate': self.engine in APPROXIMATE_ENGINES}
+                if op == "stats":
+                    return {'maps': len(self.sessions), 'footprint': self.sessions.size, 'maxFootprint': self.sessions.maxsize}
+                return {'error': "unknown op: " + str(op)}
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                return {'error': "malformed request: " + repr(e)}
+
+
+class SessionRequestHandler(SocketServer.StreamRequestHandler):
+    """Handler for a connection to a server, reading one request per line and
+    writing one response per line, both as JSON.
+    """
+
+    def setup(self):
+        self.disable_nagle_algorithm = self.server.address_family == socket.AF_INET
+        SocketServer.StreamRequestHandler.setup(self)
+
+    def handle(self):
+        for line in iter(self.rfile.readline, ""):
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {'error': "malformed request"}
+            else:
+                response = self.server.store.respond(request)
+            self.wfile.write(json.dumps(response) + "\n")
+
+
+def serve(address, store):
+    """Answer requests on a session store using one thread per connection until
+    interrupted, listening on localhost TCP or a Unix socket (see parseAddress).
+    """
+    family, address = parseAddress(address)
+    if family == socket.AF_INET:
+        server = SocketServer.ThreadingTCPServer(address, SessionRequestHandler, bind_and_activate=False)
+        server.allow_reuse_address = True
+        server.server_bind()
+        server.server_activate()
+    else:
+        server = SocketServer.ThreadingUnixStreamServer(address, SessionRequestHandler)
+    server.daemon_threads = True
+    server.store = store
+
+    sys.stderr.write("Listening on " + str(server.server_address) + "\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if family == socket.AF_UNIX:
+            os.remove(address)
+
+
+class SessionClient:
+    """Connection to a server started using --serve."""
+
+    socket = None
+    file = None
+
+    def __init__(self, address):
+        family, address = parseAddress(address)
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket.connect(address)
+        self.file = self.socket.makefile("rb")
+
+    def request(self, request):
+        """Send a request (see SessionStore.respond) and return the response,
+        raising a ValueError if it's an error.
+        """
+        self.socket.sendall(json.dumps(request) + "\n")
+        response = json.loads(self.file.readline())
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response
+
+    def upload(self, lines):
+        """Upload a map given as lines like in the input format and return its
+        handle.
+        """
+        return self.request({'op': "upload", 'map': list(lines)})['handle']
+
+    def query(self, handle, start, end):
+        """Find the shortest path between the start and end coordinates on the
+        map with the given handle, returning the number of moves (or -1 if no
+        path exists) and the path as a list of (x, y) tuples.
+        """
+        response = self.request({'op': "query", 'handle': handle, 'start': start, 'end': end})
+        return response['moves'], [tuple(c) for c in response['path']]
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+def main():
+    # process options
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "-v1", dest="verbose", action="store_const", const=1, help="enable output of the map and highlighted path")
+    parser.add_argument("-v2", dest="verbose", action="store_const", const=2, help="additionally highlight visited fields and, if no path from start to end is found, the \"best effort\" path")
+    parser.set_defaults(verbose=0)
+    parser.add_argument("--engine", choices=sorted(ENGINES) + sorted(APPROXIMATE_ENGINES), help="search engine used for finding the shortest path, the hierarchical engine finds approximate answers and is only available with --queries and --serve (default: statespace)")
+    parser.set_defaults(engine="statespace")
+    parser.add_argument("--queries", dest="queries", action="store_true", help="read any number of queries \"STARTX STARTY ENDX ENDY\" (one per line) instead of a single start and end after the map, print the answer to each of them and the throughput to stderr")
+    parser.add_argument("--cachesize", type=int, help="maximum number of answers cached per map in --queries and --serve mode (default: 1024)")
+    parser.set_defaults(cachesize=1024)
+    parser.add_argument("--resultcache", metavar="DIR", help="answer from the results stored in directory DIR if the same map, start, end and engine have been seen before (without computing the graph), and store new results there")
+    parser.add_argument("--resultcachelimit", metavar="MB", type=int, help="size in megabytes the --resultcache directory may take up before the least recently used results are deleted (default: 64)")
+    parser.set_defaults(resultcachelimit=64)
+    parser.add_argument("--serve", metavar="ADDRESS", help="instead of reading input, answer requests to upload maps and query paths on them (see SessionStore.respond in boobytraps.py) on ADDRESS, either HOST:PORT (e.g. localhost:7474) or the path of a Unix socket, keeping the parsed maps and graphs in memory")
+    parser.add_argument("--memory", metavar="MB", type=int, help="estimated memory in megabytes the maps kept in --serve mode may use before the least recently used ones are discarded (default: 256)")
+    parser.set_defaults(memory=256)
+    parser.add_argument("--multi", dest="multi", action="store_true", help="read any number of concatenated instances and print the answer to each of them in input order, exiting with status 1 if any of them is impossible")
+    parser.add_argument("--workers", type=int, help="number of worker processes solving instances in --multi mode or expanding search layers using the parallel engine (default: number of CPUs)")
+    parser.add_argument("--distances", metavar="FILE", help="instead of stopping at the end, compute the minimum number of moves from the start to every cell and write it to FILE as a HEIGHT x WIDTH grid of 32-bit integers (-1 for unreachable cells), in NumPy's .npy format if FILE ends with .npy or as plain binary data otherwise")
+    parser.add_argument("--distancelevels", dest="distancelevels", action="store_true", help="write a separate grid for each maximum triggered trap level (0 for none, then the traps in domination order) to the --distances file, i.e. a LEVELS x HEIGHT x WIDTH array")
+    parser.add_argument("--heatmap", dest="heatmap", action="store_true", help="like --distances, but print the map with cells shaded by their distance from the start (can be combined with --distances)")
+    parser.add_argument("--stats", dest="stats", action="store_true", help="print counters describing the search (states expanded and enqueued, peak queue length, visited cells per trap level, rejected neighbors) and the time taken by each phase to stderr as JSON, the counters are only complete for the reference, statespace and parallel engines")
+    parser.add_argument("--sample", metavar="N", type=int, help="record the queue length and visited set sizes before every N-th expanded state and include them in the --stats output (implies --stats, only supported by the reference, statespace and parallel engines)")
+    parser.add_argument("--noindex", dest="noindex", action="store_true", help="always search instead of first checking whether start and end are connected at all using the connectivity index, which answers many impossible instances without searching (the index is never used with -v2)")
+    parser.add_argument("--profile", metavar="FILE", help="run parsing, graph building and search under cProfile, write the profile to FILE (e.g. boobytraps.pstats, for use with the pstats module) and print the functions taking the most cumulative time to stderr")
+    parser.add_argument("--profiletop", metavar="N", type=int, help="number of functions printed by --profile (default: 20)")
+    parser.set_defaults(profiletop=20)
+    parser.add_argument("files", metavar="INPUT_FILE", nargs="*", help="input file, either in the text format described in boobytraps.pdf or in the binary map format written by gravedigger.py --binary (default: read text from stdin)")
+    args = parser.parse_args()
+    verbose = args.verbose >= 1
+    verbose2 = args.verbose >= 2
+
+    if args.serve and (verbose or args.queries or args.multi or args.distances or args.heatmap or args.stats or args.profile or args.files):
+        parser.error("--serve can only be combined with --engine, --cachesize and --memory")
+    if args.multi and (verbose or args.queries):
+        parser.error("--multi can't be combined with -v, -v1, -v2 or --queries")
+    if (args.distances or args.heatmap) and (args.multi or args.queries):
+        parser.error("--distances and --heatmap can't be combined with --multi or --queries")
+    if args.sample is not None:
+        if args.sample < 1:
+            parser.error("--sample must be at least 1")
+        if args.engine not in ["reference", "statespace", "parallel"]:
+            parser.error("--sample is only supported by the reference, statespace and parallel engines")
+        args.stats = True
+    if (args.stats or args.profile) and (args.multi or args.queries or args.distances or args.heatmap):
+        parser.error("--stats, --sample and --profile can't be combined with --multi, --queries, --distances or --heatmap")
+    if args.resultcache and (args.queries or args.distances or args.heatmap or args.stats):
+        parser.error("--resultcache can't be combined with --queries, --distances, --heatmap, --stats or --sample")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.engine in APPROXIMATE_ENGINES and not (args.queries or args.serve):
+        parser.error("--engine " + args.engine + " can only be combined with --queries or --serve")
+    if args.engine == "wavefront" and importNumPy() is None:
+        parser.error("--engine wavefront requires NumPy")
+
+    # answer queries on uploaded maps
+    if args.serve:
+        serve(args.serve, SessionStore(args.engine, args.memory * 1024 * 1024, args.cachesize))
+        return
+
+    resultCache = None
+    if args.resultcache:
+        resultCache = ResultCache(args.resultcache, args.resultcachelimit * 1024 * 1024)
+
+    # solve many instances in parallel
+    if args.multi:
+        impossible = False
+        for moves in raidTombsInParallel(parseInstances(fileinput.input(args.files)), args.engine, args.workers, resultCache, not args.noindex):
+            if moves >= 0:
+                print moves
+            else:
+                print "IMPOSSIBLE"
+                impossible = True
+            sys.stdout.flush()
+        if impossible:
+            sys.exit(1)
+        return
+
+    # answer many queries on the same map
+    if args.queries:
+        traps, map, graph, queries = parseQueries(fileinput.input(args.files))
+        raidTombs(Session(traps, map, graph, args.engine, args.cachesize), queries, verbose)
+        return
+
+    # profile parsing, graph building and search
+    if args.profile:
+        profile = cProfile.Profile()
+        profile.enable()
+
+    # parse input, memory-mapping single input files (the graph isn't needed
+    # for answers from the connectivity index or the result cache, so it's only
+    # computed right before searching unless the index can't be used)
+    stats = {'engine': args.engine} if args.stats else None
+    if args.sample:
+        stats['sampleInterval'] = args.sample
+    buildGraph = resultCache is None and (args.noindex or verbose2 or args.distances or args.heatmap)
+    if len(args.files) == 1 and isBinaryMap(args.files[0]):
+        traps, map, graph, start, end = loadBinaryMap(args.files[0], stats, buildGraph)
+    elif len(args.files) <= 1:
+        traps, map, graph, start, end = loadTextMap(args.files[0] if args.files else None, stats, buildGraph)
+    else:
+        traps, map, graph, start, end = parseInput(fileinput.input(args.files), stats, buildGraph)
+
+    # compute and output the distance field, answering the query using it
+    if args.distances or args.heatmap:
+        levels, best = distanceField(map, graph, traps, start)
+        if args.distances and args.distancelevels:
+            writeGrid(args.distances, levels, (len(traps.trapDominationOrder) + 1, map.height, map.width))
+        elif args.distances:
+            writeGrid(args.distances, best, (map.height, map.width))
+        if args.heatmap:
+            print "Map:"
+            map.prettyprint(start, end, distances=best)
+            print "Minimum number of moves to reach the end position from the start position:"
+        moves = best[end.y * map.width + end.x]
+        if moves > 0:  # like raidTomb, never consider the empty path a solution
+            print moves
+        else:
+            print "IMPOSSIBLE"
+            sys.exit(1)
+        return
+
+    # consult the connectivity index before searching, unless the visited
+    # cells and "best effort" path are needed
+    possible = True
+    if not args.noindex and not verbose2:
+        t = time.time()
+        possible, lowerBound = ConnectivityIndex(map, traps).query(start, end)
+        if stats is not None:
+            stats['time']['index'] = time.time() - t
+            stats['lowerBound'] = lowerBound
 
     # raid the tomb
-    moves, path, visited = raidTomb(graph, traps, start, end)
+    if possible and resultCache is None and graph is None:
+        t = time.time()
+        graph = CSRGraph(map)
+        if stats is not None:
+            stats['time']['graph'] = time.time() - t
+    t = time.time()
+    if not possible:
+        moves, path, visited = -1, [], set()
+    elif resultCache is not None:
+        moves, path, visited = raidTombCached(resultCache, traps, map, start, end, args.engine, verbose2)
+    elif args.engine == "parallel":
+        moves, path, visited = raidTombParallel(graph, traps, start, end, stats=stats, workers=args.workers)
+    else:
+        moves, path, visited = ENGINES[args.engine](graph, traps, start, end, stats=stats)
+    answeredBy = "search" if possible else "index"
+    if stats is not None:
+        if possible:
+            stats['time']['search'] = time.time() - t
+        stats['answeredBy'] = answeredBy
+        stats['moves'] = moves
+        sys.stderr.write(json.dumps(stats, sort_keys=True) + "\n")
+    if verbose:
+        sys.stderr.write("Answered by the " + ("connectivity index" if answeredBy == "index" else "search") + "\n")
+
+    if args.profile:
+        profile.disable()
+        profile.dump_stats(args.profile)
+        pstats.Stats(profile, stream=sys.stderr).sort_stats("cumulative").print_stats(args.profiletop)
 
     # discard visited and "best effort" path if the verbose2 option is disabled
     if not verbose2:
@@ -0,0 +1,214 @@
+#!/usr/bin/env python2.7
+
+# Builds corpora of maps for benchmarking and regression testing boobytraps.py:
+# generates one map for each combination of map size, map generation mode,
+# complexity and seed in parallel using gravedigger.py and writes them to a
+# single corpus file, which contains an index of the offsets of all maps, so
+# any map can be read without scanning the rest. The maps are stored in the
+# binary map format and can be extracted as text.
+#
+# Usage: ./catacombs.py [build | list | cat] [OPTIONS]
+#
+#        For OPTIONS, see ./catacombs.py build -h, ./catacombs.py list -h or
+#        ./catacombs.py cat -h.
+#
+# Examples: ./catacombs.py build -o corpus.bin --sizes 50,100 --modes dungeon --seeds 0-99
+#           ./catacombs.py list corpus.bin
+#           ./catacombs.py cat corpus.bin 3 4 | ./boobytraps.py --multi
+
+import argparse
+import collections
+import itertools
+import mmap
+import multiprocessing
+import struct
+import sys
+import StringIO
+import gravedigger
+from boobytraps import writeBinaryMap, parseBinaryMap
+
+# corpus file format: header (see CORPUS_HEADER), followed by the maps in the
+# binary map format and finally the index, one entry (see CORPUS_ENTRY) per map
+CORPUS_MAGIC = "BTCRP\x01"
+CORPUS_HEADER = struct.Struct("<6sIQ")  # magic, number of maps, offset of the index
+CORPUS_ENTRY = struct.Struct("<QIIIBdQ")  # offset and length of the map, width, height, mode, complexity, seed
+MODES = ["random", "dungeon"]
+
+CorpusEntry = collections.namedtuple("CorpusEntry", ["offset", "length", "width", "height", "mode", "complexity", "seed"])
+
+
+def generateInstance(job):
+    """Generate the map for a (width, height, mode, complexity, seed, corners,
+    vectorized) tuple using gravedigger.py, with start and end in the upper left
+    and lower right corners if corners is true, and return it in the binary map
+    format.
+    """
+    width, height, mode, complexity, seed, corners, vectorized = job
+    start = end = None
+    if corners:
+        start, end = (0, 0), (width - 1, height - 1)
+
+    trapDominationOrdering, rows, start, end = gravedigger.generateMap(width, height, mode, complexity, str(seed), start, end, vectorized)
+
+    f = StringIO.StringIO()
+    writeBinaryMap(f, trapDominationOrdering, width, height, rows, start, end)
+    return f.getvalue()
+
+
+def buildCorpus(filename, jobs, workers=None):
+    """Generate the maps for a list of jobs (see generateInstance) using a
+    number of worker processes (by default one per CPU) and write them to a
+    corpus file in the order of the jobs.
+    """
+    index = []
+    with open(filename, "wb") as f:
+        f.write(CORPUS_HEADER.pack(CORPUS_MAGIC, len(jobs), 0))
+        offset = CORPUS_HEADER.size
+
+        if workers == 1:
+            pool = None
+            instances = itertools.imap(generateInstance, jobs)
+        else:
+            pool = multiprocessing.Pool(workers)
+            instances = pool.imap(generateInstance, jobs, chunksize=4)
+
+        try:
+            for job, instance in itertools.izip(jobs, instances):
+                width, height, mode, complexity, seed, corners, vectorized = job
+                f.write(instance)
+                index.append(CorpusEntry(offset, len(instance), width, height, mode, complexity, seed))
+                offset += len(instance)
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        # write the index and point the header to it
+        for entry in index:
+            f.write(CORPUS_ENTRY.pack(entry.offset, entry.length, entry.width, entry.height, MODES.index(entry.mode), entry.complexity, entry.seed))
+        f.seek(0)
+        f.write(CORPUS_HEADER.pack(CORPUS_MAGIC, len(index), offset))
+
+    return index
+
+
+class Corpus(object):
+    """Memory-mapped corpus file, providing random access to its maps, each of
+    which is parsed like boobytraps.py parses a map in the binary map format.
+    """
+
+    data = None
+    entries = None
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count, indexOffset = CORPUS_HEADER.unpack_from(self.data)
+        if magic != CORPUS_MAGIC:
+            raise ValueError(filename + " is not a corpus")
+
+        self.entries = []
+        for i in xrange(count):
+            offset, length, width, height, mode, complexity, seed = CORPUS_ENTRY.unpack_from(self.data, indexOffset + i * CORPUS_ENTRY.size)
+            self.entries.append(CorpusEntry(offset, length, width, height, MODES[mode], complexity, seed))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        """Get the traps, map, graph, start and end of the i-th map."""
+        return parseBinaryMap(self.data, self.entries[i].offset)
+
+    def getText(self, i):
+        """Get the i-th map in the input format of boobytraps.py."""
+        traps, map, graph, start, end = parseBinaryMap(self.data, self.entries[i].offset, buildGraph=False)
+        lines = ["".join(traps.trapDominationOrder), str(map.width) + " " + str(map.height)]
+        lines += list(map.map)
+        lines += [str(start.x) + " " + str(start.y), str(end.x) + " " + str(end.y)]
+        return "\n".join(lines) + "\n"
+
+
+def parseRange(string):
+    """Parse a seed range like 0-99 (both inclusive) or a single seed."""
+    if "-" in string:
+        first, last = [int(i) for i in string.split("-", 1)]
+        return range(first, last + 1)
+    return [int(string)]
+
+
+def main():
+    # process options
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="subcommand", title="subcommands", help="choose from these subcommands")
+
+    parser_build = subparsers.add_parser("build", help="generate a map for each combination of map size, mode, complexity and seed and write them to a corpus file")
+    parser_build.add_argument("-o", dest="output", metavar="CORPUS_FILE", required=True, help="corpus file to write")
+    parser_build.add_argument("--sizes", type=str, help="comma-separated list of map widths/heights, either WIDTH or WIDTHxHEIGHT (default: 50,100,200)")
+    parser_build.set_defaults(sizes="50,100,200")
+    parser_build.add_argument("--modes", type=str, help="comma-separated list of map generation modes (default: random,dungeon)")
+    parser_build.set_defaults(modes="random,dungeon")
+    parser_build.add_argument("--complexities", type=str, help="comma-separated list of complexities (default: 10)")
+    parser_build.set_defaults(complexities="10")
+    parser_build.add_argument("--seeds", type=str, help="range of seeds, both inclusive, e.g. 0-99 (default: 0-9)")
+    parser_build.set_defaults(seeds="0-9")
+    parser_build.add_argument("--corners", action="store_true", help="put start and end in the upper left and lower right corners instead of choosing them randomly")
+    parser_build.add_argument("--numpy", action="store_true", help="generate maps using NumPy (see gravedigger.py -h)")
+    parser_build.add_argument("--nolimit", action="store_true", help="allow maps larger than the 40000 cells permitted by the problem statement")
+    parser_build.add_argument("--workers", type=int, help="number of worker processes (default: number of CPUs)")
+
+    parser_list = subparsers.add_parser("list", help="print the index of a corpus file as comma-separated values")
+    parser_list.add_argument("corpus", metavar="CORPUS_FILE", help="corpus file")
+
+    parser_cat = subparsers.add_parser("cat", help="print maps of a corpus file in the input format of boobytraps.py")
+    parser_cat.add_argument("corpus", metavar="CORPUS_FILE", help="corpus file")
+    parser_cat.add_argument("indices", metavar="INDEX", type=int, nargs="*", help="indices of the maps to print (default: all)")
+
+    args = parser.parse_args()
+
+    if args.subcommand == "build":
+        sizes = []
+        for size in args.sizes.split(","):
+            if "x" in size:
+                sizes.append(tuple(int(i) for i in size.split("x")))
+            else:
+                sizes.append((int(size), int(size)))
+        modes = args.modes.split(",")
+        complexities = [float(i) for i in args.complexities.split(",")]
+
+        for width, height in sizes:
+            if width < 1 or height < 1:
+                parser.error("map widths and heights must be positive")
+            if width * height > 40000 and not args.nolimit:
+                parser.error("map sizes must not exceed 40000 cells (unless --nolimit is given)")
+        for mode in modes:
+            if mode not in MODES:
+                parser.error("unknown mode: " + mode)
+        for complexity in complexities:
+            if complexity <= 0:
+                parser.error("complexities must be positive")
+        if args.numpy and gravedigger.numpy is None:
+            parser.error("--numpy requires NumPy")
+        if args.workers is not None and args.workers < 1:
+            parser.error("--workers must be positive")
+
+        jobs = [(width, height, mode, complexity, seed, args.corners, args.numpy)
+                for width, height in sizes
+                for mode in modes
+                for complexity in complexities
+                for seed in parseRange(args.seeds)]
+        buildCorpus(args.output, jobs, args.workers)
+        sys.stderr.write("Wrote " + str(len(jobs)) + " maps to " + args.output + "\n")
+
+    if args.subcommand == "list":
+        corpus = Corpus(args.corpus)
+        print "Index, Offset, Length, Map width, Map height, Mode, Complexity, Seed"
+        for i, entry in enumerate(corpus.entries):
+            print ", ".join(str(field) for field in (i,) + entry)
+
+    if args.subcommand == "cat":
+        corpus = Corpus(args.corpus)
+        for i in args.indices or xrange(len(corpus)):
+            sys.stdout.write(corpus.getText(i))
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 #!/usr/bin/env python2.7
 
 # Randomly generates different kinds of (large!) maps for testing boobytraps.py
-# and writes the result to stdout. Optionally, outputs the random seed used
-# during map generation to stderr.
+# and writes the result to stdout, either as text or in the binary map format
+# that boobytraps.py memory-maps. Optionally, outputs the random seed used
+# during map generation to stderr. If NumPy is available, maps with millions of
+# cells can be generated quickly using the --numpy option.
 #
 # Usage: See ./gravedigger.py -h, or get started quickly with:
 #
@@ -12,105 +14,168 @@ import argparse
 import sys
 import random
 import math
+from boobytraps import writeBinaryMap
 
+# numpy is optional, it's only required for vectorized map generation
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+WALL = ord('x')
+EMPTY = ord('o')
+
+
+def placeTrapVectorized(map, randomState, trap, tries=42):
+    """Place a trap on a random non-wall cell of a map given as a NumPy array,
+    giving up after a number of tries.
+    """
+    height, width = map.shape
+    for i in xrange(tries):
+        randomX = randomState.randint(0, width)
+        randomY = randomState.randint(0, height)
+        if map[randomY, randomX] != WALL:
+            map[randomY, randomX] = ord(trap)
+            return
+
+
+def placeStartAndEndVectorized(map, randomState, startX, startY, endX, endY):
+    """Choose random non-wall start and end cells of a map given as a NumPy
+    array where they are not given (i.e. False), and make sure that both aren't
+    walls.
+    """
+    height, width = map.shape
+    if startX is False:
+        startX = randomState.randint(0, width)
+        startY = randomState.randint(0, height)
+        tries = 0
+        while map[startY, startX] == WALL and tries < 42:
+            startX = randomState.randint(0, width)
+            startY = randomState.randint(0, height)
+            tries += 1
+    if endX is False:
+        endX = randomState.randint(0, width)
+        endY = randomState.randint(0, height)
+        tries = 0
+        while (endX == startX and endY == startY) or (map[endY, endX] == WALL and tries < 42):
+            endX = randomState.randint(0, width)
+            endY = randomState.randint(0, height)
+            tries += 1
+
+    # make sure that start and end aren't walls
+    if map[startY, startX] == WALL:
+        map[startY, startX] = EMPTY
+    if map[endY, endX] == WALL:
+        map[endY, endX] = EMPTY
+
+    return startX, startY, endX, endY
+
+
+def generateRandomVectorized(width, height, complexity, trapDominationOrdering, randomState):
+    """Vectorized version of the random map generation algorithm, returning the
+    map as a NumPy array of cell values (as bytes), one row per row of the map.
+    """
+    map = numpy.empty((height, width), dtype=numpy.uint8)
+    map.fill(WALL)
 
-# parse options
-parser = argparse.ArgumentParser()
-parser.add_argument("width", metavar="WIDTH", type=int, choices=xrange(1, 40001), help="desired width of the map")
-parser.add_argument("height", metavar="HEIGHT", type=int, choices=xrange(1, 40001), help="desired height of the map")
-parser.add_argument("--start", metavar="STARTX,STARTY", help="comma-separated coordinates (x,y) of the start postion, must be smaller than WIDTH,HEIGHT (default: random)")
-parser.add_argument("--end", metavar="ENDX,ENDY", help="comma-separated coordinates (x,y) of the end postion, must be smaller than WIDTH,HEIGHT (default: random)")
-parser.add_argument("--mode", choices=["random", "dungeon"], help="random (default) or dungeon (with corridors and rooms)")
-parser.add_argument("--complexity", type=float, help="complexity of the generated map, in terms of wall cell/empty cell ratio and trap frequency, must be a positive float with larger numbers meaning higher complexity (default: 1)")
-parser.add_argument("--seed", help="seed for random number generator used during map generation")
-parser.add_argument("--printseed", dest="printseed", action="store_true", help="print the seed to stderr after printing the map (might come in handy when no seed is specified using the --seed option)")
-parser.add_argument("--no-printseed", dest="printseed", action="store_false", help="don't print the seed to stderr after printing the map (default)")
-parser.set_defaults(printseed=False)
-args = parser.parse_args()
-
-if args.width * args.height > 40000:
-    sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: WIDTH * HEIGHT must not exceed 40000")
-
-if args.start:
-    startX, startY = [int(i) for i in args.start.split(",")]
-    if startX > args.width:
-        sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: STARTX must be smaller than WIDTH")
-    if startY > args.height:
-        sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: STARTY must be smaller than HEIGHT")
-else:
-    startX = startY = False
-
-if args.end:
-    endX, endY = [int(i) for i in args.end.split(",")]
-    if endX > args.width:
-        sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: ENDX must be smaller than WIDTH")
-    if endY > args.height:
-        sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: ENDY must be smaller than HEIGHT")
-else:
-    endX = endY = False
-
-if not args.mode:
-    args.mode = "random"
-
-if not args.complexity:
-    args.complexity = 10.0
-elif args.complexity <= 0:
-    sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: COMPLEXITY must be a positive float")
-
-if not args.seed:
-    rand = random.SystemRandom()
-    args.seed = str(rand.randint(0, sys.maxint))
-
-# set complexity
-complexity = args.complexity
-
-# initialize random number generator
-seed = args.seed
-random.seed(seed)
-
-# generate map
-trapDominationOrdering = "ZYXWVUTSRQPONMLKJIHGFEDCBA"
-width = args.width
-height = args.height
-
-# initialize empty map of wall cells
-map = [['x' for field in range(width)] for row in range(height)]
-
-# switch between map generation modes
-mode = args.mode
-
-# normal map generation algorithm
-if mode == "random":
     # add some empty cells
-    for i in xrange(1, int(width * height * 1.5 * (10/complexity))):
-        randomX = random.randint(0, width-1)
-        randomY = random.randint(0, height-1)
-        map[randomY][randomX] = 'o'
+    n = max(0, int(width * height * 1.5 * (10/complexity)) - 1)
+    map[randomState.randint(0, height, n), randomState.randint(0, width, n)] = EMPTY
 
     # add some traps
     for i in trapDominationOrdering[::-1]:
-        randomX = random.randint(0, width-1)
-        randomY = random.randint(0, height-1)
-        map[randomY][randomX] = i
-        if random.random() < 1 / math.sqrt(width * height * (complexity/10)):
+        map[randomState.randint(0, height), randomState.randint(0, width)] = ord(i)
+        if randomState.random_sample() < 1 / math.sqrt(width * height * (complexity/10)):
             break
 
-    # set start and end points
+    return map
+
+
+def generateDungeonVectorized(width, height, complexity, trapDominationOrdering, randomState):
+    """Vectorized version of the dungeon map generation algorithm, drawing
+    corridors and rooms as slice assignments and returning the map like
+    generateRandomVectorized.
+    """
+    map = numpy.empty((height, width), dtype=numpy.uint8)
+    map.fill(WALL)
+
+    # add some corridors
+    n = max(0, int(math.floor(((width+height) * (10/complexity)) / 4)) - 1)
+    # horizontal
+    randomXs = randomState.randint(0, width, n)
+    randomYs = randomState.randint(0, height, n)
+    randomRadii = randomState.randint(1, max(1, (width-1) // 2) + 1, n)
+    randomXStarts = numpy.clip(randomXs - randomRadii - 1, 0, width-1)
+    randomXStops = numpy.clip(randomXs + randomRadii, 0, width-1)
+    for y, xStart, xStop in zip(randomYs, randomXStarts, randomXStops):
+        map[y, xStart:xStop + 1] = EMPTY
+
+    # vertical
+    randomXs = randomState.randint(0, width, n)
+    randomYs = randomState.randint(0, height, n)
+    randomRadii = randomState.randint(1, max(1, (height-1) // 2) + 1, n)
+    randomYStarts = numpy.clip(randomYs - randomRadii - 1, 0, height-1)
+    randomYStops = numpy.clip(randomYs + randomRadii, 0, height-1)
+    for x, yStart, yStop in zip(randomXs, randomYStarts, randomYStops):
+        map[yStart:yStop + 1, x] = EMPTY
+
+    # add some random empty cells
+    n = max(0, int(math.floor((width+height) * (10/complexity))) - 1)
+    map[randomState.randint(0, height, n), randomState.randint(0, width, n)] = EMPTY
+
+    # add some traps: no traps wanted in rooms on small maps
+    for i in trapDominationOrdering[::-1]:
+        while randomState.random_sample() < .5 * (complexity/10):
+            placeTrapVectorized(map, randomState, i)
+            if randomState.random_sample() < 2 / math.log((width+height) * (complexity/10)):
+                break
+
+    # add some rooms
+    n = max(0, int(math.floor(((width + height) * (10/complexity)) / 8)) - 1)
+    randomXs = randomState.randint(0, width, n)
+    randomYs = randomState.randint(0, height, n)
+    randomXRadii = randomState.randint(1, max(1, int(math.sqrt((width-1) / 2))) + 1, n)
+    randomYRadii = randomState.randint(1, max(1, int(math.sqrt((height-1) / 2))) + 1, n)
+    randomXStarts = numpy.clip(randomXs - randomXRadii - 1, 0, width-1)
+    randomXStops = numpy.clip(randomXs + randomXRadii, 0, width-1)
+    randomYStarts = numpy.clip(randomYs - randomYRadii - 1, 0, height-1)
+    randomYStops = numpy.clip(randomYs + randomYRadii, 0, height-1)
+    for xStart, xStop, yStart, yStop in zip(randomXStarts, randomXStops, randomYStarts, randomYStops):
+        map[yStart:yStop + 1, xStart:xStop + 1] = EMPTY
+
+    # add more traps on giant maps
+    if width * height >= 5000:
+        for i in trapDominationOrdering[::-1]:
+            while randomState.random_sample() < .67 * (complexity/10):
+                placeTrapVectorized(map, randomState, i)
+                if randomState.random_sample() < 1 / math.log((width*height) * (complexity/10)):
+                    break
+
+    return map
+
+
+def placeStartAndEnd(map, rand, startX, startY, endX, endY):
+    """Choose random non-wall start and end cells of a map given as a list of
+    rows where they are not given (i.e. False), and make sure that both aren't
+    walls.
+    """
+    width = len(map[0])
+    height = len(map)
     if startX is False:
-        startX = random.randint(0, width-1)
-        startY = random.randint(0, height-1)
+        startX = rand.randint(0, width-1)
+        startY = rand.randint(0, height-1)
         tries = 0
         while map[startY][startX] == 'x' and tries < 42:
-            startX = random.randint(0, width-1)
-            startY = random.randint(0, height-1)
+            startX = rand.randint(0, width-1)
+            startY = rand.randint(0, height-1)
             tries += 1
     if endX is False:
-        endX = random.randint(0, width-1)
-        endY = random.randint(0, height-1)
+        endX = rand.randint(0, width-1)
+        endY = rand.randint(0, height-1)
         tries = 0
         while (endX == startX and endY == startY) or (map[endY][endX] == 'x' and tries < 42):
-            endX = random.randint(0, width-1)
-            endY = random.randint(0, height-1)
+            endX = rand.randint(0, width-1)
+            endY = rand.randint(0, height-1)
             tries += 1
 
     # make sure that start and end aren't walls
@@ -119,14 +184,45 @@ if mode == "random":
     if map[endY][endX] == 'x':
         map[endY][endX] = 'o'
 
-# dungeon map generation algorithm
-elif mode == "dungeon":
+    return startX, startY, endX, endY
+
+
+def generateRandom(width, height, complexity, trapDominationOrdering, rand):
+    """Normal map generation algorithm, returning the map as a list of rows,
+    each a list of cell values.
+    """
+    # initialize empty map of wall cells
+    map = [['x' for field in range(width)] for row in range(height)]
+
+    # add some empty cells
+    for i in xrange(1, int(width * height * 1.5 * (10/complexity))):
+        randomX = rand.randint(0, width-1)
+        randomY = rand.randint(0, height-1)
+        map[randomY][randomX] = 'o'
+
+    # add some traps
+    for i in trapDominationOrdering[::-1]:
+        randomX = rand.randint(0, width-1)
+        randomY = rand.randint(0, height-1)
+        map[randomY][randomX] = i
+        if rand.random() < 1 / math.sqrt(width * height * (complexity/10)):
+            break
+
+    return map
+
+
+def generateDungeon(width, height, complexity, trapDominationOrdering, rand):
+    """Dungeon map generation algorithm, returning the map like generateRandom.
+    """
+    # initialize empty map of wall cells
+    map = [['x' for field in range(width)] for row in range(height)]
+
     # add some corridors
     # horizontal
     for i in xrange(1, int(math.floor(((width+height) * (10/complexity)) / 4))):
-        randomX = random.randint(0, width-1)
-        randomY = random.randint(0, height-1)
-        randomRadius = random.randint(1, max(1, math.floor((width-1) / 2)))
+        randomX = rand.randint(0, width-1)
+        randomY = rand.randint(0, height-1)
+        randomRadius = rand.randint(1, max(1, math.floor((width-1) / 2)))
         randomXStart = max(0, min(width-1, randomX - randomRadius - 1))
         randomXStop = max(0, min(width-1, randomX + randomRadius))
         for x in xrange(randomXStart, randomXStop + 1):
@@ -134,9 +230,9 @@ elif mode == "dungeon":
 
     # vertical
     for i in xrange(1, int(math.floor(((width + height) * (10/complexity)) / 4))):
-        randomX = random.randint(0, width-1)
-        randomY = random.randint(0, height-1)
-        randomRadius = random.randint(1, max(1, math.floor((height-1) / 2)))
+        randomX = rand.randint(0, width-1)
+        randomY = rand.randint(0, height-1)
+        randomRadius = rand.randint(1, max(1, math.floor((height-1) / 2)))
         randomYStart = max(0, min(height-1, randomY - randomRadius - 1))
         randomYStop = max(0, min(height-1, randomY + randomRadius))
         for y in xrange(randomYStart, randomYStop + 1):
@@ -144,31 +240,31 @@ elif mode == "dungeon":
 
     # add some random empty cells
     for i in xrange(1, int(math.floor((width+height) * (10/complexity)))):
-        randomX = random.randint(0, width-1)
-        randomY = random.randint(0, height-1)
+        randomX = rand.randint(0, width-1)
+        randomY = rand.randint(0, height-1)
         map[randomY][randomX] = 'o'
 
     # add some traps: no traps wanted in rooms on small maps
     for i in trapDominationOrdering[::-1]:
-        while random.random() < .5 * (complexity/10):
-            randomX = random.randint(0, width-1)
-            randomY = random.randint(0, height-1)
+        while rand.random() < .5 * (complexity/10):
+            randomX = rand.randint(0, width-1)
+            randomY = rand.randint(0, height-1)
             tries = 0
             while map[randomY][randomX] == 'x' and tries < 42:
-                randomX = random.randint(0, width-1)
-                randomY = random.randint(0, height-1)
+                randomX = rand.randint(0, width-1)
+                randomY = rand.randint(0, height-1)
                 tries += 1
             if tries < 42:
                 map[randomY][randomX] = i
-            if random.random() < 2 / math.log((width+height) * (complexity/10)):
+            if rand.random() < 2 / math.log((width+height) * (complexity/10)):
                 break
 
     # add some rooms
     for i in xrange(1, int(math.floor(((width + height) * (10/complexity)) / 8))):
-        randomX = random.randint(0, width-1)
-        randomY = random.randint(0, height-1)
-        randomXRadius = random.randint(1, max(1, int(math.sqrt((width-1) / 2))))
-        randomYRadius = random.randint(1, max(1, int(math.sqrt((height-1) / 2))))
+        randomX = rand.randint(0, width-1)
+        randomY = rand.randint(0, height-1)
+        randomXRadius = rand.randint(1, max(1, int(math.sqrt((width-1) / 2))))
+        randomYRadius = rand.randint(1, max(1, int(math.sqrt((height-1) / 2))))
         randomXStart = max(0, min(width-1, randomX - randomXRadius - 1))
         randomXStop = max(0, min(width-1, randomX + randomXRadius))
         randomYStart = max(0, min(height-1, randomY - randomYRadius - 1))
@@ -180,51 +276,136 @@ elif mode == "dungeon":
     # add more traps on giant maps
     if width * height >= 5000:
         for i in trapDominationOrdering[::-1]:
-            while random.random() < .67 * (complexity/10):
-                randomX = random.randint(0, width-1)
-                randomY = random.randint(0, height-1)
+            while rand.random() < .67 * (complexity/10):
+                randomX = rand.randint(0, width-1)
+                randomY = rand.randint(0, height-1)
                 tries = 0
                 while map[randomY][randomX] == 'x' and tries < 42:
-                    randomX = random.randint(0, width-1)
-                    randomY = random.randint(0, height-1)
+                    randomX = rand.randint(0, width-1)
+                    randomY = rand.randint(0, height-1)
                     tries += 1
                 if tries < 42:
                     map[randomY][randomX] = i
-                if random.random() < 1 / math.log((width*height) * (complexity/10)):
+                if rand.random() < 1 / math.log((width*height) * (complexity/10)):
                     break
 
-    # set start and end points
-    if startX is False:
-        startX = random.randint(0, width-1)
-        startY = random.randint(0, height-1)
-        tries = 0
-        while map[startY][startX] == 'x' and tries < 42:
-            startX = random.randint(0, width-1)
-            startY = random.randint(0, height-1)
-            tries += 1
-    if endX is False:
-        endX = random.randint(0, width-1)
-        endY = random.randint(0, height-1)
-        tries = 0
-        while (endX == startX and endY == startY) or (map[endY][endX] == 'x' and tries < 42):
-            endX = random.randint(0, width-1)
-            endY = random.randint(0, height-1)
-            tries += 1
+    return map
 
-    # make sure that start and end aren't walls
-    if map[startY][startX] == 'x':
-        map[startY][startX] = 'o'
-    if map[endY][endX] == 'x':
-        map[endY][endX] = 'o'
 
-# print map
-print trapDominationOrdering
-print str(width) + " " + str(height)
-for y in map:
-    print ''.join(y)
-print str(startX) + " " + str(startY)
-print str(endX) + " " + str(endY)
-
-# print seed
-if args.printseed:
-    sys.stderr.write("Seed:\n" + str(seed) + "\n")
+def generateMap(width, height, mode="random", complexity=10.0, seed=None, start=None, end=None, vectorized=False):
+    """Randomly generate a map, with start and end given as (x, y) tuples or
+    chosen randomly if None, and return the trap domination ordering, the rows
+    of the map (as an iterator of strings, so the map can be streamed row by
+    row), the start and the end (as (x, y) tuples). The same seed always yields
+    the same map. Vectorized map generation requires NumPy.
+    """
+    # the generation algorithms divide by the complexity, which may be an int
+    complexity = float(complexity)
+    if seed is None:
+        seed = str(random.SystemRandom().randint(0, sys.maxint))
+    startX, startY = start if start is not None else (False, False)
+    endX, endY = end if end is not None else (False, False)
+
+    # initialize random number generator
+    rand = random.Random(seed)
+
+    trapDominationOrdering = "ZYXWVUTSRQPONMLKJIHGFEDCBA"
+
+    # vectorized map generation algorithms, with the random number generator
+    # seeded from the seeded random number generator to keep maps reproducible
+    if vectorized:
+        randomState = numpy.random.RandomState(rand.randint(0, 2**32 - 1))
+        if mode == "random":
+            map = generateRandomVectorized(width, height, complexity, trapDominationOrdering, randomState)
+        elif mode == "dungeon":
+            map = generateDungeonVectorized(width, height, complexity, trapDominationOrdering, randomState)
+        startX, startY, endX, endY = placeStartAndEndVectorized(map, randomState, startX, startY, endX, endY)
+        rows = (row.tobytes() for row in map)
+
+    # normal map generation algorithms
+    else:
+        if mode == "random":
+            map = generateRandom(width, height, complexity, trapDominationOrdering, rand)
+        elif mode == "dungeon":
+            map = generateDungeon(width, height, complexity, trapDominationOrdering, rand)
+        startX, startY, endX, endY = placeStartAndEnd(map, rand, startX, startY, endX, endY)
+        rows = (''.join(row) for row in map)
+
+    return trapDominationOrdering, rows, (startX, startY), (endX, endY)
+
+
+def main():
+    # parse options
+    parser = argparse.ArgumentParser()
+    parser.add_argument("width", metavar="WIDTH", type=int, choices=xrange(1, 40001), help="desired width of the map")
+    parser.add_argument("height", metavar="HEIGHT", type=int, choices=xrange(1, 40001), help="desired height of the map")
+    parser.add_argument("--start", metavar="STARTX,STARTY", help="comma-separated coordinates (x,y) of the start postion, must be smaller than WIDTH,HEIGHT (default: random)")
+    parser.add_argument("--end", metavar="ENDX,ENDY", help="comma-separated coordinates (x,y) of the end postion, must be smaller than WIDTH,HEIGHT (default: random)")
+    parser.add_argument("--mode", choices=["random", "dungeon"], help="random (default) or dungeon (with corridors and rooms)")
+    parser.add_argument("--complexity", type=float, help="complexity of the generated map, in terms of wall cell/empty cell ratio and trap frequency, must be a positive float with larger numbers meaning higher complexity (default: 1)")
+    parser.add_argument("--seed", help="seed for random number generator used during map generation")
+    parser.add_argument("--printseed", dest="printseed", action="store_true", help="print the seed to stderr after printing the map (might come in handy when no seed is specified using the --seed option)")
+    parser.add_argument("--no-printseed", dest="printseed", action="store_false", help="don't print the seed to stderr after printing the map (default)")
+    parser.set_defaults(printseed=False)
+    parser.add_argument("--binary", action="store_true", help="write the map in the binary map format instead of as text, redirect stdout to a file that can then be passed to boobytraps.py")
+    parser.add_argument("--numpy", action="store_true", help="generate the map using NumPy, which is much faster for large maps (note that the same seed yields different maps with and without this option)")
+    parser.add_argument("--nolimit", action="store_true", help="allow maps larger than the 40000 cells permitted by the problem statement")
+    args = parser.parse_args()
+
+    if args.width * args.height > 40000 and not args.nolimit:
+        sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: WIDTH * HEIGHT must not exceed 40000 (unless --nolimit is given)")
+
+    if args.numpy and numpy is None:
+        sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: --numpy requires NumPy")
+
+    start = end = None
+
+    if args.start:
+        startX, startY = [int(i) for i in args.start.split(",")]
+        if startX > args.width:
+            sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: STARTX must be smaller than WIDTH")
+        if startY > args.height:
+            sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: STARTY must be smaller than HEIGHT")
+        start = (startX, startY)
+
+    if args.end:
+        endX, endY = [int(i) for i in args.end.split(",")]
+        if endX > args.width:
+            sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: ENDX must be smaller than WIDTH")
+        if endY > args.height:
+            sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: ENDY must be smaller than HEIGHT")
+        end = (endX, endY)
+
+    if not args.mode:
+        args.mode = "random"
+
+    if not args.complexity:
+        args.complexity = 10.0
+    elif args.complexity <= 0:
+        sys.exit("usage: see " + __file__ + " -h\n" + __file__ + ": error: COMPLEXITY must be a positive float")
+
+    if not args.seed:
+        rand = random.SystemRandom()
+        args.seed = str(rand.randint(0, sys.maxint))
+
+    # generate map
+    trapDominationOrdering, rows, start, end = generateMap(args.width, args.height, args.mode, args.complexity, args.seed, start, end, args.numpy)
+
+    # print map, streaming it row by row
+    if args.binary:
+        writeBinaryMap(sys.stdout, trapDominationOrdering, args.width, args.height, rows, start, end)
+    else:
+        print trapDominationOrdering
+        print str(args.width) + " " + str(args.height)
+        for row in rows:
+            sys.stdout.write(row + "\n")
+        print str(start[0]) + " " + str(start[1])
+        print str(end[0]) + " " + str(end[1])
+
+    # print seed
+    if args.printseed:
+        sys.stdout.flush()
+        sys.stderr.write("Seed:\n" + str(args.seed) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python2.7
+
+# Tests parsing maps in the text format from a buffer using parseTextMap.
+#
+# Usage: python -m unittest test_boobytraps
+
+import unittest
+
+from boobytraps import *
+
+
+class ParseTextMapTest(unittest.TestCase):
+
+    def solve(self, data):
+        traps, map, graph, start, end = parseTextMap(data)
+        moves, path, visited = raidTombStateSpace(graph, traps, start, end)
+        return map, moves
+
+    def testSingleRow(self):
+        data = "A\n3 1\no.o\n0 0\n2 0\n"
+        map, moves = self.solve(data)
+        self.assertEqual(moves, 2)
+        self.assertIs(map.data, data)
+
+    def testSingleRowTwoDigitStart(self):
+        data = "A\n12 1\noooooooooooo\n10 0\n0 0\n"
+        map, moves = self.solve(data)
+        self.assertEqual(moves, 10)
+        self.assertIs(map.data, data)
+
+    def testEmptyTrapOrder(self):
+        data = "\n3 1\no.o\n0 0\n2 0\n"
+        map, moves = self.solve(data)
+        self.assertEqual(moves, 2)
+        self.assertIs(map.data, data)
+
+    def testMultipleRowsLF(self):
+        with open("sampleinput.txt") as f:
+            data = f.read()
+        map, moves = self.solve(data)
+        self.assertEqual(moves, 17)
+        self.assertIs(map.data, data)
+
+    def testMultipleRowsCRLF(self):
+        with open("sampleinput.txt") as f:
+            data = f.read().replace("\n", "\r\n")
+        map, moves = self.solve(data)
+        self.assertEqual(moves, 17)
+        self.assertIs(map.data, data)
+
+    def testTrailingWhitespace(self):
+        data = "A\n3 2\no.o \nooo\n0 0\n2 0\n"
+        map, moves = self.solve(data)
+        self.assertEqual(moves, 2)
+        self.assertIsNot(map.data, data)
+
+
+if __name__ == "__main__":
+    unittest.main()